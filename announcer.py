@@ -0,0 +1,89 @@
+import asyncio
+import time
+import discord
+
+# --- Trade Announcement Publisher ---
+# Matching hands fills over and moves on. A background task collects them for
+# a short window, then posts one summary embed per ticker, packing up to ten
+# embeds into each message.
+
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_TRADE_LINES = 10
+
+
+class TradePublisher:
+    def __init__(self, bot, channel_id, names, window=3.0, min_interval=1.0):
+        self.bot = bot
+        self.names = names
+        self.channel_id = channel_id
+        self.window = window
+        self.min_interval = min_interval
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._last_send = 0.0
+
+    def publish(self, fills):
+        if not fills:
+            return
+        for fill in fills:
+            self._queue.put_nowait(fill)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(self.window)
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await self._flush(batch)
+            except Exception as e:
+                print(f"Failed to publish {len(batch)} trade(s): {e}")
+
+    def _build_embeds(self, batch, trader_names):
+        by_ticker = {}
+        for fill in batch:
+            by_ticker.setdefault(fill.ticker, []).append(fill)
+
+        embeds = []
+        for ticker, fills in by_ticker.items():
+            volume = sum(f.amount for f in fills)
+            value = sum(f.amount * f.price for f in fills)
+            prices = [f.price for f in fills]
+            embed = discord.Embed(title=f"📈 Trades Executed: `{ticker}`", description=f"**{volume}** shares of `{ticker}` traded in **{len(fills)}** fill(s).", color=discord.Color.magenta())
+            embed.add_field(name="Last Price", value=f"✨ {prices[-1]:,.2f} / token", inline=True)
+            embed.add_field(name="Avg Price", value=f"✨ {value / volume:,.2f} / token", inline=True)
+            embed.add_field(name="Range", value=f"✨ {min(prices):,.2f} - {max(prices):,.2f}", inline=True)
+            embed.add_field(name="Total Value", value=f"✨ {value:,.2f}", inline=False)
+            lines = [f"**{f.amount}** @ ✨ {f.price:,.2f} ({trader_names[f.buyer_id]} ← {trader_names[f.seller_id]})" for f in fills[-MAX_TRADE_LINES:]]
+            if len(fills) > MAX_TRADE_LINES:
+                lines.insert(0, f"...and {len(fills) - MAX_TRADE_LINES} earlier fill(s)")
+            embed.add_field(name="Fills", value="\n".join(lines), inline=False)
+            embeds.append(embed)
+        return embeds
+
+    async def _flush(self, batch):
+        channel = self.bot.get_channel(self.channel_id)
+        if not channel:
+            return
+        trader_names = await self.names.resolve_many([f.buyer_id for f in batch] + [f.seller_id for f in batch])
+        embeds = self._build_embeds(batch, trader_names)
+        for i in range(0, len(embeds), MAX_EMBEDS_PER_MESSAGE):
+            await self._send(channel, embeds[i:i + MAX_EMBEDS_PER_MESSAGE])
+
+    async def _send(self, channel, embeds):
+        wait = self._last_send + self.min_interval - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        while True:
+            try:
+                await channel.send(embeds=embeds)
+                break
+            except discord.HTTPException as e:
+                if e.status != 429:
+                    raise
+                # The library already waits on bucket headers; this covers a 429 that still slips through.
+                retry_after = float(e.response.headers.get('Retry-After', self.min_interval))
+                await asyncio.sleep(retry_after)
+        self._last_send = time.monotonic()
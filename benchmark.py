@@ -0,0 +1,353 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# --- Offline Exchange Benchmark ---
+# Seeds a synthetic guild economy in a scratch directory, imports the bot's command
+# handlers with stand-in ctx/bot objects (no gateway, no REST), replays a mix of
+# commands and reports throughput plus p50/p95/p99 latency per command and per
+# fill. Passing --baseline turns it into a regression gate for CI.
+#
+#   python benchmark.py --users 10000 --orders 100000 --ops 5000
+#   python benchmark.py --json results.json
+#   python benchmark.py --baseline results.json --tolerance 0.25
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_GUILD_ID = 1
+BENCH_CONFIG = {"weekly_allowances": [], "unranked_allowance": 150, "trading_channel_id": "1", "economy_dir": "economies"}
+DEFAULT_MIX = "buy=30,sell=30,ladder=2,buy_ico=5,cancel_order=5,market=10,profile=8,orderbook=7,view=3,chart=2,leaderboard=3"
+MID_PRICE = 10.0
+
+
+# --- Stand-ins for Discord objects ---
+class FakeAvatar:
+    url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f"trader{user_id}"
+        self.display_name = self.name
+        self.mention = f"<@{user_id}>"
+        self.roles = []
+        self.display_avatar = FakeAvatar()
+
+
+class FakeFollowup:
+    def __init__(self):
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+
+
+class FakeInteraction:
+    def __init__(self, followup):
+        self.followup = followup
+
+
+class FakeContext:
+    def __init__(self, user_id):
+        self.author = FakeUser(user_id)
+        self.guild_id = BENCH_GUILD_ID
+        self.followup = FakeFollowup()
+        self.interaction = FakeInteraction(self.followup)
+
+    async def defer(self, **kwargs):
+        pass
+
+    async def respond(self, *args, **kwargs):
+        await self.followup.send(*args, **kwargs)
+
+
+class FakeChannel:
+    def __init__(self):
+        self.messages = 0
+
+    async def send(self, *args, **kwargs):
+        self.messages += 1
+
+
+class FakePaginator:
+    def __init__(self, pages, **kwargs):
+        self.pages = pages
+
+    async def respond(self, interaction, **kwargs):
+        await interaction.followup.send(embed=self.pages[0])
+
+
+class FakeDiscord:
+    """Replaces the REST and cache lookups on the real bot instance."""
+
+    def __init__(self, rest_latency):
+        self.rest_latency = rest_latency
+        self.rest_calls = 0
+        self.channel = FakeChannel()
+
+    def get_user(self, user_id):
+        return None
+
+    def get_channel(self, channel_id):
+        return self.channel
+
+    async def fetch_user(self, user_id):
+        self.rest_calls += 1
+        await asyncio.sleep(self.rest_latency)
+        return FakeUser(user_id)
+
+    def install(self, bot):
+        bot.get_user = self.get_user
+        bot.get_channel = self.get_channel
+        bot.fetch_user = self.fetch_user
+
+
+# --- Synthetic Data ---
+class Universe:
+    def __init__(self):
+        self.users = []
+        self.active_tickers = []
+        self.ico_tickers = []
+        self.holders = {}
+        self.open_orders = []
+
+
+def seed(path, users, tickers, ico_tickers, orders, rng):
+    from migrations import migrate
+    migrate(path)
+    universe = Universe()
+    conn = sqlite3.connect(path)
+    deadline = (datetime.utcnow() + timedelta(days=30)).isoformat()
+
+    universe.users = list(range(1, users + 1))
+    conn.executemany("INSERT INTO users (user_id, kcred_balance) VALUES (?, ?)", [(u, 1_000_000.0) for u in universe.users])
+
+    goals, holdings = [], []
+    for i in range(tickers + ico_tickers):
+        status = 'ACTIVE' if i < tickers else 'ICO'
+        ticker = f"BNCH-T{i}-{1000 + i}"
+        founder = rng.choice(universe.users)
+        goals.append((ticker, founder, f"Scenario {i}", str(1000 + i), "30-Day Standard", MID_PRICE, status, deadline, deadline))
+        if status == 'ICO':
+            universe.ico_tickers.append(ticker)
+            holdings.append((founder, ticker, 60))
+            continue
+        universe.active_tickers.append(ticker)
+        holders = rng.sample(universe.users, min(len(universe.users), 20))
+        universe.holders[ticker] = holders
+        holdings.extend((holder, ticker, 100_000) for holder in holders)
+    conn.executemany("INSERT INTO goals (ticker, founder_id, scenario, target_score, tier, ico_price, status, initial_deadline, current_deadline) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", goals)
+    conn.executemany("INSERT INTO holdings (user_id, ticker, amount) VALUES (?, ?, ?)", holdings)
+
+    # Resting book that does not cross: bids below the mid, asks above it.
+    rows = []
+    for _ in range(orders):
+        ticker = rng.choice(universe.active_tickers)
+        if rng.random() < 0.5:
+            rows.append((rng.choice(universe.holders[ticker]), ticker, 'SELL', rng.randint(1, 10), round(MID_PRICE * rng.uniform(1.02, 1.5), 2)))
+        else:
+            rows.append((rng.choice(universe.users), ticker, 'BUY', rng.randint(1, 10), round(MID_PRICE * rng.uniform(0.5, 0.98), 2)))
+    conn.executemany("INSERT INTO orders (user_id, ticker, order_type, amount, price_per_token) VALUES (?, ?, ?, ?, ?)", rows)
+    conn.execute("""UPDATE users SET kcred_balance = kcred_balance - escrow.total, reserved = escrow.total
+                    FROM (SELECT user_id, SUM(amount * price_per_token) AS total FROM orders WHERE order_type = 'BUY' GROUP BY user_id) AS escrow
+                    WHERE users.user_id = escrow.user_id""")
+    conn.commit()
+    universe.open_orders = conn.execute("SELECT order_id, user_id FROM orders WHERE status = 'OPEN'").fetchall()
+    conn.close()
+    return universe
+
+
+# --- Workload ---
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, weight = part.split("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def next_operation(name, universe, rng):
+    """Returns (user_id, args) for one command invocation."""
+    if name in ("buy", "sell"):
+        ticker = rng.choice(universe.active_tickers)
+        amount = rng.randint(1, 10)
+        if name == "buy":
+            return rng.choice(universe.users), (ticker, amount, round(MID_PRICE * rng.uniform(0.9, 1.1), 2))
+        return rng.choice(universe.holders[ticker]), (ticker, amount, round(MID_PRICE * rng.uniform(0.95, 1.15), 2))
+    if name == "ladder":
+        ticker = rng.choice(universe.active_tickers)
+        levels = [f"buy {rng.randint(1, 5)}@{MID_PRICE * (0.97 - i * 0.01):.2f}" for i in range(5)]
+        levels += [f"sell {rng.randint(1, 5)}@{MID_PRICE * (1.03 + i * 0.01):.2f}" for i in range(5)]
+        return rng.choice(universe.holders[ticker]), (ticker, ", ".join(levels))
+    if name == "buy_ico":
+        return rng.choice(universe.users), (rng.choice(universe.ico_tickers), 1)
+    if name == "cancel_order":
+        if not universe.open_orders:
+            return rng.choice(universe.users), (0,)
+        order_id, user_id = universe.open_orders.pop(rng.randrange(len(universe.open_orders)))
+        return user_id, (order_id,)
+    if name == "profile":
+        return rng.choice(universe.users), (None,)
+    if name in ("orderbook", "view"):
+        return rng.choice(universe.users), (rng.choice(universe.active_tickers),)
+    if name == "chart":
+        return rng.choice(universe.users), (rng.choice(universe.active_tickers), "1d")
+    return rng.choice(universe.users), ()
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def summarize(samples, elapsed):
+    return {
+        "count": len(samples),
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+    }
+
+
+async def replay(main, universe, mix, ops, concurrency, rng):
+    started = time.perf_counter()
+    exchange = await main.exchanges.get(BENCH_GUILD_ID)
+    startup = time.perf_counter() - started
+    latencies = {name: [] for name in mix}
+    fill_latencies, pass_latencies = [], []
+
+    execute_matches = main.execute_matches
+
+    def timed_execute_matches(conn, ex, ticker):
+        started = time.perf_counter()
+        fills = execute_matches(conn, ex, ticker)
+        duration = time.perf_counter() - started
+        pass_latencies.append(duration)
+        # Fills inside one pass aren't timed separately; each gets the pass average.
+        fill_latencies.extend([duration / len(fills)] * len(fills))
+        return fills
+
+    main.execute_matches = timed_execute_matches
+
+    names, weights = list(mix), list(mix.values())
+    schedule = rng.choices(names, weights=weights, k=ops)
+    queue = asyncio.Queue()
+    for name in schedule:
+        queue.put_nowait(name)
+
+    async def worker():
+        while not queue.empty():
+            name = queue.get_nowait()
+            user_id, args = next_operation(name, universe, rng)
+            command = getattr(main, name).callback
+            started = time.perf_counter()
+            with main.stats.scope(name):
+                await command(FakeContext(user_id), *args)
+            latencies[name].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    await exchange.matcher.join()
+    elapsed = time.perf_counter() - started
+
+    results = {"elapsed_s": elapsed, "startup_s": startup, "total_ops": ops, "ops_per_s": ops / elapsed, "commands": {}}
+    scopes, _, _ = main.stats.snapshot()
+    for name, samples in latencies.items():
+        results["commands"][name] = summarize(samples, elapsed)
+        scope = scopes.get(name)
+        results["commands"][name]["queries_per_op"] = scope.queries / len(samples) if scope and samples else 0.0
+    results["fills"] = summarize(fill_latencies, elapsed)
+    results["matching_passes"] = summarize(pass_latencies, elapsed)
+    return results
+
+
+def print_report(results, rest_calls):
+    print(f"\n{results['total_ops']} commands in {results['elapsed_s']:.2f}s ({results['ops_per_s']:.1f} ops/s), {rest_calls} REST calls")
+    print(f"{'':<16}{'count':>8}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sql/op':>8}")
+    rows = list(results["commands"].items()) + [("(avg per fill)", results["fills"]), ("(match pass)", results["matching_passes"])]
+    for name, stats in rows:
+        print(f"{name:<16}{stats['count']:>8}{stats['throughput']:>10.1f}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats.get('queries_per_op', 0):>8.1f}")
+
+
+def check_baseline(results, baseline_path, tolerance):
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    regressions = []
+    for name, stats in list(results["commands"].items()) + [("(avg per fill)", results["fills"])]:
+        base = baseline["commands"].get(name) if name != "(avg per fill)" else baseline.get("fills")
+        if not base or not base["count"] or not stats["count"]:
+            continue
+        if stats["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {stats['p95_ms']:.2f}ms vs baseline {base['p95_ms']:.2f}ms")
+    return regressions
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load and latency benchmark for the exchange.")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--tickers", type=int, default=200, help="Actively trading tickers")
+    parser.add_argument("--ico-tickers", type=int, default=50)
+    parser.add_argument("--orders", type=int, default=100_000, help="Resting open orders to seed")
+    parser.add_argument("--ops", type=int, default=5_000, help="Commands to replay")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Comma separated command=weight pairs")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rest-latency", type=float, default=0.0, help="Simulated seconds per fetch_user call")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Fail if p95 latencies regress against this results file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    json_path = os.path.abspath(args.json) if args.json else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    cwd = os.getcwd()
+    sys.path.insert(0, REPO_DIR)
+    with tempfile.TemporaryDirectory(prefix="exchange-bench-") as workdir:
+        os.chdir(workdir)
+        try:
+            with open('config.json', 'w') as f:
+                json.dump(BENCH_CONFIG, f)
+
+            started = time.perf_counter()
+            os.makedirs(BENCH_CONFIG["economy_dir"])
+            universe = seed(os.path.join(BENCH_CONFIG["economy_dir"], f"{BENCH_GUILD_ID}.db"), args.users, args.tickers, args.ico_tickers, args.orders, rng)
+            print(f"Seeded {args.users} users, {args.tickers + args.ico_tickers} goals and {args.orders} orders in {time.perf_counter() - started:.2f}s ({workdir})")
+
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                import main
+                fake = FakeDiscord(args.rest_latency)
+                fake.install(main.bot)
+                main.Paginator = FakePaginator
+                results = asyncio.run(replay(main, universe, mix, args.ops, args.concurrency, rng))
+                main.exchanges.close()
+        finally:
+            os.chdir(cwd)
+
+    print(f"Startup (migrations + book rebuild): {results['startup_s']:.2f}s")
+    print_report(results, fake.rest_calls)
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+    if baseline_path:
+        regressions = check_baseline(results, baseline_path, args.tolerance)
+        if regressions:
+            print("\nPerformance regressions:\n" + "\n".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
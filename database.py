@@ -0,0 +1,96 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from instrumentation import VM_STEP_GRANULARITY
+
+# --- Shared Data Access Layer ---
+# Connections are long-lived and owned by the thread that opened them. Reads fan
+# out over a small pool; every write goes through one dedicated writer thread so
+# SQLite never sees two writers and the event loop never blocks on disk I/O.
+# Several databases can share one bounded reader pool; each pool thread then
+# keeps one connection per database it has served. With stats attached, every
+# call records its latency, statement count and VM steps against the scope of
+# the coroutine that issued it.
+
+
+class Database:
+    def __init__(self, path='economy.db', readers=4, stats=None):
+        """readers is a pool size, or an executor shared with other databases."""
+        self.path = path
+        self.stats = stats
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._owns_readers = isinstance(readers, int)
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-read') if self._owns_readers else readers
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-write')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("PRAGMA busy_timeout = 5000")
+            conn.execute("PRAGMA temp_store = MEMORY")
+            conn.execute("PRAGMA cache_size = -16000")
+            conn.execute("PRAGMA mmap_size = 268435456")
+            if self.stats is not None:
+                conn.set_trace_callback(self._count_statement)
+                conn.set_progress_handler(self._count_vm_steps, VM_STEP_GRANULARITY)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def _count_statement(self, sql):
+        self._local.statements += 1
+
+    def _count_vm_steps(self):
+        self._local.vm_steps += VM_STEP_GRANULARITY
+        return 0
+
+    def _run(self, kind, scope, fn, args):
+        conn = self._connection()
+        self._local.statements = self._local.vm_steps = 0
+        started = time.perf_counter()
+        try:
+            result = fn(conn, *args)
+            if kind == 'write':
+                conn.commit()
+            return result
+        except BaseException:
+            if kind == 'write':
+                conn.rollback()
+            raise
+        finally:
+            if self.stats is not None:
+                self.stats.record_query(scope, kind, (time.perf_counter() - started) * 1000, self._local.statements, self._local.vm_steps)
+
+    def _scope(self):
+        return self.stats.current_scope() if self.stats is not None else None
+
+    async def read(self, fn, *args):
+        """Run fn(conn, *args) on a reader thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._readers, self._run, 'read', self._scope(), fn, args)
+
+    async def write(self, fn, *args):
+        """Run fn(conn, *args) as one transaction on the writer thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._writer, self._run, 'write', self._scope(), fn, args)
+
+    async def fetchone(self, sql, params=()):
+        return await self.read(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql, params=()):
+        return await self.read(lambda conn: conn.execute(sql, params).fetchall())
+
+    def close(self):
+        if self._owns_readers:
+            self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
@@ -0,0 +1,88 @@
+import asyncio
+import heapq
+import time
+from datetime import datetime, timezone
+
+# --- Goal Deadline Scheduler ---
+# Pending deadlines sit in a min-heap, so the task only ever looks at the
+# earliest one: it sleeps until that moment, pops every goal due by then and
+# hands them to the expiry callback as one batch. Rescheduling a ticker just
+# pushes a new entry; the outdated one is skipped when it reaches the top.
+
+
+def deadline_timestamp(deadline):
+    if isinstance(deadline, (int, float)):
+        return float(deadline)
+    if isinstance(deadline, str):
+        deadline = datetime.fromisoformat(deadline)
+    if deadline.tzinfo is None:
+        deadline = deadline.replace(tzinfo=timezone.utc)
+    return deadline.timestamp()
+
+
+class DeadlineScheduler:
+    def __init__(self, expire):
+        self._expire = expire
+        self._heap = []
+        self._deadlines = {}
+        self._wakeup = None
+        self._task = None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def load(self, conn):
+        for ticker, deadline in conn.execute("SELECT ticker, current_deadline FROM goals WHERE status IN ('ICO', 'ACTIVE')"):
+            self.schedule(ticker, deadline)
+
+    def schedule(self, ticker, deadline):
+        timestamp = deadline_timestamp(deadline)
+        self._deadlines[ticker] = timestamp
+        heapq.heappush(self._heap, (timestamp, ticker))
+        if self._wakeup is not None and self._heap[0] == (timestamp, ticker):
+            self._wakeup.set()
+
+    def discard(self, ticker):
+        self._deadlines.pop(ticker, None)
+
+    def next(self):
+        """Timestamp of the earliest pending deadline, or None."""
+        return min(self._deadlines.values(), default=None)
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = self._wakeup = None
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            timestamp, ticker = heapq.heappop(self._heap)
+            if self._deadlines.get(ticker) == timestamp:
+                del self._deadlines[ticker]
+                due.append(ticker)
+        return due
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            due = self._pop_due(now)
+            if due:
+                try:
+                    await self._expire(due)
+                except Exception as e:
+                    print(f"Failed to expire {len(due)} goal(s), retrying in a minute: {e}")
+                    for ticker in due:
+                        self.schedule(ticker, now + 60)
+                continue
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,51 @@
+import discord
+from orderbook import OrderBook
+
+# --- Order Book Depth View ---
+# /orderbook is rendered straight from the in-memory book, which keeps per-level
+# sizes as orders are added, filled and cancelled. The embed is memoized per
+# ticker until the book's version changes, so repeat views of a hot ticker run
+# no queries and no rendering at all.
+
+DEPTH_LEVELS = 10
+
+
+def render_levels(levels):
+    lines, cumulative = [], 0
+    for price, size in levels:
+        cumulative += size
+        lines.append(f"✨ {price:.2f} - **{size}** (Σ {cumulative})")
+    return "\n".join(lines)
+
+
+class DepthView:
+    def __init__(self, books, levels=DEPTH_LEVELS):
+        self.books = books
+        self.levels = levels
+        self._rendered = {}
+
+    def embed(self, ticker):
+        book = self.books.books.get(ticker)
+        if book is None:
+            # Don't create books (or cache entries) for whatever gets typed in
+            return self._render(OrderBook(ticker))
+        version = book.version
+        cached = self._rendered.get(ticker)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        embed = self._render(book)
+        self._rendered[ticker] = (version, embed)
+        return embed
+
+    def _render(self, book):
+        ticker = book.ticker
+        asks, ask_levels = book.depth('SELL', self.levels)
+        bids, bid_levels = book.depth('BUY', self.levels)
+        embed = discord.Embed(title=f"Order Book for `{ticker}`", color=discord.Color.orange())
+        embed.add_field(name="🔴 Asks (Sellers)", value=render_levels(asks) or "No open sell orders", inline=True)
+        embed.add_field(name="🟢 Bids (Buyers)", value=render_levels(bids) or "No open buy orders", inline=True)
+        if ask_levels > self.levels or bid_levels > self.levels:
+            embed.set_footer(text=f"Showing the best {self.levels} of {ask_levels} ask and {bid_levels} bid levels. Σ is the cumulative size.")
+        else:
+            embed.set_footer(text="Σ is the cumulative size up to each level.")
+        return embed
@@ -0,0 +1,265 @@
+import asyncio
+import contextlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from announcer import TradePublisher
+from database import Database
+from deadlines import DeadlineScheduler
+from depth import DepthView
+from journal import snapshot_paths, take_snapshot
+from leaderboard import Leaderboard
+from market import MarketSnapshot
+from matching import MatchScheduler
+from migrations import migrate
+from orderbook import OrderBookManager
+from portfolio import Portfolios
+from settlement import pending_settlements, run_settlement
+from tickers import TickerIndex
+
+# --- Per-Guild Exchanges ---
+# Every guild runs its own economy in its own SQLite file. Each one has its own
+# writer thread, order books, leaderboard, schedulers and announcement channel,
+# so a busy guild never queues behind another. The bot, the stats, the name
+# cache and one bounded reader pool are shared. Exchanges open the first time a
+# guild needs one and close again after sitting idle, so threads and file
+# handles follow the active guilds rather than every guild the bot is in. A
+# closed guild's next goal deadline stays armed in the registry, which reopens
+# the exchange when it comes due.
+
+GUILD_SETTINGS = ('weekly_allowances', 'unranked_allowance', 'trading_channel_id', 'auction_intervals')
+IDLE_CHECK_INTERVAL = 60
+
+
+def guild_settings(config, guild_id):
+    """Global config values, overridden by the guild's entry under "guilds"."""
+    settings = {key: config[key] for key in GUILD_SETTINGS if key in config}
+    settings.update(config.get('guilds', {}).get(str(guild_id), {}))
+    settings.setdefault('auction_intervals', {})
+    try:
+        settings['trading_channel_id'] = int(settings.get('trading_channel_id'))
+    except (TypeError, ValueError):
+        settings['trading_channel_id'] = None
+    return settings
+
+
+def next_deadline(path):
+    """The earliest open goal deadline in a guild's database, read without opening its exchange."""
+    if not os.path.exists(path):
+        return None
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT MIN(current_deadline) FROM goals WHERE status IN ('ICO', 'ACTIVE')").fetchone()[0]
+    except sqlite3.OperationalError:
+        return None  # Not migrated yet
+    finally:
+        conn.close()
+
+
+def adopt_database(source, path):
+    """Move a database to path, checkpointing its WAL first so nothing stays behind."""
+    with contextlib.closing(sqlite3.connect(source)) as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    os.replace(source, path)
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(source + suffix):
+            os.remove(source + suffix)
+
+
+class Exchange:
+    def __init__(self, guild_id, settings, path, bot, stats, names, run_pass, expire, readers):
+        self.guild_id = guild_id
+        self.settings = settings
+        self.last_used = time.monotonic()
+        self.db = Database(path, readers=readers, stats=stats)
+        self.books = OrderBookManager()
+        self.depth = DepthView(self.books)
+        self.rankings = Leaderboard()
+        self.tickers = TickerIndex()
+        self.publisher = TradePublisher(bot, settings['trading_channel_id'], names)
+        self.market = MarketSnapshot(self.db, names, self.books)
+        self.portfolios = Portfolios(self.db, self.rankings)
+        self.matcher = MatchScheduler(lambda ticker: run_pass(self, ticker))
+        self.deadlines = DeadlineScheduler(lambda tickers: expire(self, tickers))
+        self.snapshots = None
+
+    async def snapshot_periodically(self, directory, interval):
+        # Start with a baseline so the journal can always be replayed from somewhere,
+        # and count from the newest snapshot so reopening a guild doesn't reset the clock
+        paths = snapshot_paths(directory)
+        delay = max(0, interval - (time.time() - os.path.getmtime(paths[-1]))) if paths else 0
+        while True:
+            await asyncio.sleep(delay)
+            delay = interval
+            try:
+                path = await self.db.read(take_snapshot, directory)
+                print(f"[{self.guild_id}] Wrote snapshot {path}")
+            except Exception as e:
+                print(f"[{self.guild_id}] Snapshot failed: {e}")
+
+    async def close(self):
+        self.deadlines.stop()
+        if self.snapshots is not None:
+            self.snapshots.cancel()
+        await asyncio.to_thread(self.db.close)
+
+    def prepare(self):
+        """Migrate the guild's database, finish interrupted settlements and rebuild in-memory state."""
+        migrate(self.db.path)
+        conn = sqlite3.connect(self.db.path)
+        try:
+            for ticker in pending_settlements(conn):
+                report = run_settlement(conn, ticker)
+                conn.commit()
+                print(f"[{self.guild_id}] Resumed settlement of {ticker}: {report['holders']} holder(s), {report['orders_cancelled']} order(s).")
+            self.books.load(conn)
+            self.rankings.load(conn)
+            self.tickers.load(conn)
+            self.deadlines.load(conn)
+            for ticker, interval in conn.execute("SELECT ticker, auction_interval FROM goals WHERE auction_interval > 0 AND status IN ('ICO', 'ACTIVE')"):
+                self.matcher.set_interval(ticker, interval)
+        finally:
+            conn.close()
+
+
+class ExchangeRegistry:
+    def __init__(self, config, bot, stats, names, run_pass, expire):
+        self.config = config
+        self.directory = config.get('economy_dir', 'economies')
+        self.snapshot_dir = config.get('snapshot_dir', 'snapshots')
+        self.snapshot_interval = config.get('snapshot_interval', 0)
+        self.idle_timeout = config.get('exchange_idle_timeout', 900)
+        self.legacy_database = config.get('legacy_database', 'economy.db')
+        self.readers = ThreadPoolExecutor(max_workers=config.get('reader_threads', 8), thread_name_prefix='db-read')
+        self.wakeups = DeadlineScheduler(self._wake)
+        self._services = (bot, stats, names, run_pass, expire)
+        self._exchanges = {}
+        self._opening = {}
+        self._evictor = None
+
+    def __iter__(self):
+        return iter(list(self._exchanges.values()))
+
+    def path(self, guild_id):
+        return os.path.join(self.directory, f"{guild_id}.db")
+
+    def peek(self, guild_id):
+        """The guild's exchange if it is already open, without opening it."""
+        return self._exchanges.get(guild_id)
+
+    def _legacy_owner(self):
+        """The guild a single-server install's economy.db belongs to: the configured
+        legacy_guild_id, or else the only guild the bot is in."""
+        if self.config.get('legacy_guild_id'):
+            return int(self.config['legacy_guild_id'])
+        guilds = self._services[0].guilds
+        if len(guilds) != 1:
+            raise RuntimeError(
+                f"Found {self.legacy_database} from a single-server install, but the bot is in {len(guilds)} servers. "
+                f"Set legacy_guild_id in config.json to the server it belongs to, or move it to {self.path('<guild_id>')} yourself."
+            )
+        return guilds[0].id
+
+    async def _adopt_legacy(self, guild_id):
+        path = self.path(guild_id)
+        if os.path.exists(path) or not os.path.exists(self.legacy_database):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        await asyncio.to_thread(adopt_database, self.legacy_database, path)
+        print(f"[{guild_id}] Moved {self.legacy_database} from the single-server install to {path}")
+
+    async def arm(self, guild_ids):
+        """Schedule each closed guild's next goal deadline without opening its exchange."""
+        if os.path.exists(self.legacy_database):
+            try:
+                await self._adopt_legacy(self._legacy_owner())
+            except RuntimeError as e:
+                print(e)
+        loop = asyncio.get_running_loop()
+        closed = [guild_id for guild_id in guild_ids if guild_id not in self._exchanges]
+        deadlines = await asyncio.gather(*(loop.run_in_executor(self.readers, next_deadline, self.path(guild_id)) for guild_id in closed))
+        for guild_id, deadline in zip(closed, deadlines):
+            if deadline is not None:
+                self.wakeups.schedule(guild_id, deadline)
+        self.wakeups.start()
+
+    async def _wake(self, guild_ids):
+        # Opening loads the guild's own deadlines and expires whatever is due
+        await asyncio.gather(*(self.get(guild_id) for guild_id in guild_ids))
+
+    async def get(self, guild_id) -> Exchange:
+        exchange = self._exchanges.get(guild_id)
+        if exchange is not None:
+            exchange.last_used = time.monotonic()
+            return exchange
+        opening = self._opening.get(guild_id)
+        if opening is None:
+            opening = self._start_opening(guild_id)
+        return await asyncio.shield(opening)
+
+    def warm(self, guild_id):
+        """Start opening a guild's exchange in the background without waiting for it."""
+        if guild_id in self._exchanges or guild_id in self._opening:
+            return
+        self._start_opening(guild_id).add_done_callback(lambda task: self._report_open(guild_id, task))
+
+    def _start_opening(self, guild_id):
+        opening = self._opening[guild_id] = asyncio.ensure_future(self._open(guild_id))
+        opening.add_done_callback(lambda task: self._opened(guild_id, task))
+        return opening
+
+    def _opened(self, guild_id, task):
+        if self._opening.get(guild_id) is task:
+            del self._opening[guild_id]
+
+    @staticmethod
+    def _report_open(guild_id, task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[{guild_id}] Failed to open exchange: {task.exception()}")
+
+    async def _open(self, guild_id):
+        os.makedirs(self.directory, exist_ok=True)
+        # Never start a fresh economy for a guild whose old one is still waiting to be adopted
+        if os.path.exists(self.legacy_database) and not os.path.exists(self.path(guild_id)):
+            if self._legacy_owner() == guild_id:
+                await self._adopt_legacy(guild_id)
+        exchange = Exchange(guild_id, guild_settings(self.config, guild_id), self.path(guild_id), *self._services, self.readers)
+        await asyncio.to_thread(exchange.prepare)
+        exchange.deadlines.start()
+        if self.snapshot_interval:
+            exchange.snapshots = asyncio.create_task(exchange.snapshot_periodically(os.path.join(self.snapshot_dir, str(guild_id)), self.snapshot_interval))
+        # Auction books may have been left crossed mid-interval by a restart
+        for ticker in exchange.matcher.intervals:
+            exchange.matcher.trigger(ticker)
+        self.wakeups.discard(guild_id)
+        self._exchanges[guild_id] = exchange
+        if self._evictor is None and self.idle_timeout:
+            self._evictor = asyncio.create_task(self._close_idle())
+        return exchange
+
+    async def _close_idle(self):
+        while True:
+            await asyncio.sleep(IDLE_CHECK_INTERVAL)
+            cutoff = time.monotonic() - self.idle_timeout
+            for guild_id, exchange in list(self._exchanges.items()):
+                if exchange.last_used > cutoff or exchange.matcher.busy():
+                    continue
+                del self._exchanges[guild_id]
+                deadline = exchange.deadlines.next()
+                if deadline is not None:
+                    self.wakeups.schedule(guild_id, deadline)
+                    self.wakeups.start()
+                try:
+                    await exchange.close()
+                except Exception as e:
+                    print(f"[{guild_id}] Failed to close idle exchange: {e}")
+
+    def close(self):
+        self.wakeups.stop()
+        if self._evictor is not None:
+            self._evictor.cancel()
+        for exchange in self._exchanges.values():
+            exchange.deadlines.stop()
+            exchange.db.close()
+        self.readers.shutdown(wait=True)
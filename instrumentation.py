@@ -0,0 +1,175 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# --- Hot-Path Instrumentation ---
+# Cheap enough to leave on: fixed-bucket histograms, plain counters and a
+# context variable naming the command (or background job) the current task is
+# working for, so database and Discord calls can be attributed to it.
+
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# SQLite reports progress every N virtual machine steps; used as a proxy for rows scanned.
+VM_STEP_GRANULARITY = 1000
+
+_scope = ContextVar('exchange_stats_scope', default='background')
+
+
+class Histogram:
+    __slots__ = ("counts", "total", "sum_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the given percentile."""
+        if not self.total:
+            return 0.0
+        target = pct / 100 * self.total
+        running = 0
+        for i, count in enumerate(self.counts):
+            running += count
+            if running >= target:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else float('inf')
+        return float('inf')
+
+
+class ScopeStats:
+    __slots__ = ("latency", "queries", "query_ms", "vm_steps", "api_calls", "errors")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.queries = 0
+        self.query_ms = 0.0
+        self.vm_steps = 0
+        self.api_calls = 0
+        self.errors = 0
+
+
+class ExchangeStats:
+    def __init__(self):
+        self.started = time.time()
+        self.scopes = {}
+        self.counters = {}
+        self.query_latency = {'read': Histogram(), 'write': Histogram()}
+        self.api_routes = {}
+        self._lock = threading.Lock()
+
+    def _scope_stats(self, name):
+        stats = self.scopes.get(name)
+        if stats is None:
+            stats = self.scopes[name] = ScopeStats()
+        return stats
+
+    def uptime(self):
+        return time.time() - self.started
+
+    def snapshot(self):
+        """Copies of the scope and route tables, safe to iterate on the event loop."""
+        with self._lock:
+            return dict(self.scopes), dict(self.api_routes), dict(self.counters)
+
+    # --- Scopes ---
+    @staticmethod
+    def current_scope():
+        return _scope.get()
+
+    def enter(self, name):
+        return _scope.set(name), time.perf_counter()
+
+    def exit(self, token, started, failed=False):
+        name = _scope.get()
+        _scope.reset(token)
+        with self._lock:
+            stats = self._scope_stats(name)
+            stats.latency.observe((time.perf_counter() - started) * 1000)
+            stats.errors += failed
+
+    @contextmanager
+    def scope(self, name):
+        token, started = self.enter(name)
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            self.exit(token, started, failed)
+
+    # --- Recorders ---
+    def record_query(self, scope, kind, ms, statements, vm_steps):
+        with self._lock:
+            stats = self._scope_stats(scope)
+            stats.queries += statements
+            stats.query_ms += ms
+            stats.vm_steps += vm_steps
+            self.query_latency[kind].observe(ms)
+
+    def record_error(self, scope):
+        with self._lock:
+            self._scope_stats(scope).errors += 1
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_api_call(self, route):
+        with self._lock:
+            self._scope_stats(_scope.get()).api_calls += 1
+            self.api_routes[route] = self.api_routes.get(route, 0) + 1
+
+    def instrument_http(self, http):
+        """Count every REST call the bot makes, by route and by scope."""
+        request = http.request
+
+        async def counted_request(route, **kwargs):
+            self.record_api_call(f"{route.method} {route.path}")
+            return await request(route, **kwargs)
+
+        http.request = counted_request
+
+    # --- Export ---
+    def prometheus(self):
+        lines = [
+            "# TYPE exchange_uptime_seconds gauge",
+            f"exchange_uptime_seconds {self.uptime():.0f}",
+            "# TYPE exchange_scope_latency_ms histogram",
+        ]
+        with self._lock:
+            for name, stats in sorted(self.scopes.items()):
+                running = 0
+                for bound, count in zip(LATENCY_BUCKETS_MS + ('+Inf',), stats.latency.counts):
+                    running += count
+                    lines.append(f'exchange_scope_latency_ms_bucket{{scope="{name}",le="{bound}"}} {running}')
+                lines.append(f'exchange_scope_latency_ms_sum{{scope="{name}"}} {stats.latency.sum_ms:.3f}')
+                lines.append(f'exchange_scope_latency_ms_count{{scope="{name}"}} {stats.latency.total}')
+            for metric, attr in (("queries", "queries"), ("vm_steps", "vm_steps"), ("api_calls", "api_calls"), ("errors", "errors")):
+                lines.append(f"# TYPE exchange_scope_{metric}_total counter")
+                for name, stats in sorted(self.scopes.items()):
+                    lines.append(f'exchange_scope_{metric}_total{{scope="{name}"}} {getattr(stats, attr)}')
+            lines.append("# TYPE exchange_query_latency_ms summary")
+            for kind, histogram in self.query_latency.items():
+                for pct in (50, 95, 99):
+                    lines.append(f'exchange_query_latency_ms{{kind="{kind}",quantile="{pct / 100}"}} {histogram.percentile(pct)}')
+                lines.append(f'exchange_query_latency_ms_count{{kind="{kind}"}} {histogram.total}')
+            lines.append("# TYPE exchange_api_calls_total counter")
+            for route, count in sorted(self.api_routes.items()):
+                lines.append(f'exchange_api_calls_total{{route="{route}"}} {count}')
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE exchange_{name}_total counter")
+                lines.append(f"exchange_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus())
+        os.replace(tmp_path, path)
@@ -0,0 +1,72 @@
+import json
+import os
+import sqlite3
+import time
+
+# --- Order-Event Journal ---
+# Every command that changes the economy appends its event to the `events`
+# table inside the same transaction, so the journal and the state it produced
+# always commit together. Snapshots are plain `VACUUM INTO` copies taken from a
+# reader connection; replay.py rebuilds state from one by applying the events
+# recorded after it.
+#
+#   kind       user_id   ticker  order_id   amount         price      ref
+#   ALLOWANCE  user      -       -          Auras          -          -
+#   MINT       founder   ticker  -          founder tokens ICO price  -    (data: fee and goal fields)
+#   ICO        investor  ticker  -          tokens         ICO price  founder
+#   BUY, SELL  user      ticker  order      tokens         limit      -
+#   CANCEL     user      ticker  order      -              -          -
+#   FILL       buyer     ticker  buy order  tokens         price      sell order
+#   EXPIRE     -         ticker  -          -              -          -
+#   RESOLVE    -         ticker  -          -              -          -    (data: outcome; trading halts)
+#   SETTLE     -         ticker  -          -              -          -    (data: outcome)
+#   AUCTION    -         ticker  -          seconds        -          -
+
+EVENT_INSERT = "INSERT INTO events (at, kind, user_id, ticker, order_id, amount, price, ref, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+SNAPSHOTS_KEPT = 3
+
+
+def record(conn, kind, user_id=None, ticker=None, order_id=None, amount=None, price=None, ref=None, data=None):
+    conn.execute(EVENT_INSERT, (time.time(), kind, user_id, ticker, order_id, amount, price, ref, json.dumps(data) if data is not None else None))
+
+
+def record_orders(conn, user_id, ticker, orders):
+    """orders: (order_id, side, amount, price) for a batch placed together."""
+    now = time.time()
+    conn.executemany(EVENT_INSERT, [(now, side, user_id, ticker, order_id, amount, price, None, None) for order_id, side, amount, price in orders])
+
+
+def record_fills(conn, fills):
+    now = time.time()
+    conn.executemany(EVENT_INSERT, [(now, 'FILL', f.buyer_id, f.ticker, f.buy_order_id, f.amount, f.price, f.sell_order_id, None) for f in fills])
+
+
+def last_seq(conn):
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+
+
+# --- Snapshots ---
+def snapshot_paths(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.db'))
+
+
+def take_snapshot(conn, directory, keep=SNAPSHOTS_KEPT):
+    """Copy the database into directory/<last seq>.db and prune old copies."""
+    os.makedirs(directory, exist_ok=True)
+    partial = os.path.join(directory, "snapshot.partial")
+    if os.path.exists(partial):
+        os.remove(partial)
+    conn.execute("VACUUM INTO ?", (partial,))
+    # Writes may land while the copy runs, so name it after what it actually holds
+    copy = sqlite3.connect(partial)
+    try:
+        seq = last_seq(copy)
+    finally:
+        copy.close()
+    path = os.path.join(directory, f"{seq:012d}.db")
+    os.replace(partial, path)
+    for old in snapshot_paths(directory)[:-keep]:
+        os.remove(old)
+    return path
@@ -0,0 +1,194 @@
+import random
+import threading
+
+# --- Net-Worth Leaderboard ---
+# Net worth is cash (available plus escrowed Auras) and every token a user
+# holds or has listed, marked to the ticker's last trade or its ICO price.
+# Worths live in a treap ordered by (-worth, user_id) with subtree sizes, so
+# top-N and "my rank" are O(log n). Commands refresh only the users they touched
+# and fills re-mark only the traded ticker's holders.
+
+PRICE_QUERY = """
+    SELECT g.ticker, COALESCE((SELECT price FROM trades t WHERE t.ticker = g.ticker ORDER BY trade_id DESC LIMIT 1), g.ico_price)
+    FROM goals g WHERE g.status IN ('ICO', 'ACTIVE', 'EXPIRED', 'SETTLING')
+"""
+
+POSITION_QUERY = """
+    SELECT user_id, ticker, SUM(amount) FROM (
+        SELECT user_id, ticker, amount FROM holdings WHERE asset_type = 'TOKEN' AND amount > 0 {filter}
+        UNION ALL
+        SELECT user_id, ticker, amount FROM orders WHERE order_type = 'SELL' AND status = 'OPEN' AND amount > 0 {filter}
+    ) GROUP BY user_id, ticker
+"""
+
+
+class _Node:
+    __slots__ = ("key", "priority", "size", "left", "right")
+
+    def __init__(self, key):
+        self.key = key
+        self.priority = random.random()
+        self.size = 1
+        self.left = None
+        self.right = None
+
+
+def _size(node):
+    return node.size if node else 0
+
+
+def _split(node, key):
+    """Split into (keys < key, keys >= key)."""
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        node.size = 1 + _size(node.left) + _size(node.right)
+        return node, right
+    left, node.left = _split(node.left, key)
+    node.size = 1 + _size(node.left) + _size(node.right)
+    return left, node
+
+
+def _merge(left, right):
+    if left is None or right is None:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        left.size = 1 + _size(left.left) + _size(left.right)
+        return left
+    right.left = _merge(left, right.left)
+    right.size = 1 + _size(right.left) + _size(right.right)
+    return right
+
+
+class RankTree:
+    def __init__(self):
+        self.root = None
+
+    def __len__(self):
+        return _size(self.root)
+
+    def insert(self, key):
+        left, right = _split(self.root, key)
+        self.root = _merge(_merge(left, _Node(key)), right)
+
+    def remove(self, key):
+        left, right = _split(self.root, key)
+        _, right = _split(right, (key[0], key[1] + 1))
+        self.root = _merge(left, right)
+
+    def rank(self, key):
+        """Number of keys ordered before key."""
+        node, before = self.root, 0
+        while node is not None:
+            if node.key < key:
+                before += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return before
+
+    def nth(self, index):
+        node = self.root
+        while node is not None:
+            left = _size(node.left)
+            if index < left:
+                node = node.left
+            elif index == left:
+                return node.key
+            else:
+                index -= left + 1
+                node = node.right
+        raise IndexError(index)
+
+
+class Leaderboard:
+    def __init__(self):
+        self.prices = {}
+        self.cash = {}
+        self.positions = {}
+        self.holders = {}
+        self.worth = {}
+        self._tree = RankTree()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tree)
+
+    def _read(self, conn, user_ids=None):
+        if user_ids is None:
+            cash = conn.execute("SELECT user_id, kcred_balance + COALESCE(reserved, 0) FROM users").fetchall()
+            positions = conn.execute(POSITION_QUERY.format(filter="")).fetchall()
+            return cash, positions
+        placeholders = ", ".join("?" * len(user_ids))
+        cash = conn.execute(f"SELECT user_id, kcred_balance + COALESCE(reserved, 0) FROM users WHERE user_id IN ({placeholders})", user_ids).fetchall()
+        positions = conn.execute(POSITION_QUERY.format(filter=f"AND user_id IN ({placeholders})"), (*user_ids, *user_ids)).fetchall()
+        return cash, positions
+
+    def load(self, conn):
+        prices = dict(conn.execute(PRICE_QUERY).fetchall())
+        cash, positions = self._read(conn)
+        with self._lock:
+            self.prices, self.cash, self.positions, self.holders, self.worth = prices, {}, {}, {}, {}
+            self._tree = RankTree()
+            self._apply(cash, positions, [user_id for user_id, _ in cash])
+
+    def refresh(self, conn, user_ids):
+        """Re-read cash and positions for the given users only."""
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return
+        cash, positions = self._read(conn, user_ids)
+        with self._lock:
+            self._apply(cash, positions, user_ids)
+
+    def _apply(self, cash, positions, user_ids):
+        for user_id in user_ids:
+            for ticker in self.positions.pop(user_id, ()):
+                self.holders[ticker].discard(user_id)
+        for user_id, balance in cash:
+            self.cash[user_id] = balance or 0
+        for user_id, ticker, amount in positions:
+            self.positions.setdefault(user_id, {})[ticker] = amount
+            self.holders.setdefault(ticker, set()).add(user_id)
+        for user_id in user_ids:
+            self._update(user_id)
+
+    def mark(self, ticker, price):
+        """Set a ticker's mark price and revalue everyone holding it."""
+        with self._lock:
+            self.prices[ticker] = price
+            for user_id in self.holders.get(ticker, ()):
+                self._update(user_id)
+
+    def drop(self, ticker):
+        """Stop marking a settled ticker; its tokens are no longer tradeable."""
+        with self._lock:
+            self.prices.pop(ticker, None)
+            for user_id in self.holders.pop(ticker, ()):
+                self.positions[user_id].pop(ticker, None)
+                self._update(user_id)
+
+    def _update(self, user_id):
+        worth = self.cash.get(user_id, 0) + sum(amount * self.prices.get(ticker, 0) for ticker, amount in self.positions.get(user_id, {}).items())
+        previous = self.worth.get(user_id)
+        if previous == worth:
+            return
+        if previous is not None:
+            self._tree.remove((-previous, user_id))
+        self.worth[user_id] = worth
+        self._tree.insert((-worth, user_id))
+
+    def top(self, n):
+        with self._lock:
+            keys = [self._tree.nth(i) for i in range(min(n, len(self._tree)))]
+        return [(user_id, -worth) for worth, user_id in keys]
+
+    def rank(self, user_id):
+        """1-based rank and net worth, or None for users the exchange has never seen."""
+        with self._lock:
+            worth = self.worth.get(user_id)
+            if worth is None:
+                return None
+            return self._tree.rank((-worth, user_id)) + 1, worth
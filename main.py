@@ -1,10 +1,20 @@
+import asyncio
 import discord
+import journal
 import os
 import json
+import math
 import sqlite3
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
 from typing import Annotated
+from discord.ext.pages import Paginator
+from exchange import ExchangeRegistry
+from instrumentation import ExchangeStats
+from names import NameResolver
+from orderbook import TRADING_FEE_PCT, Order
+from settlement import ASSET_NAMES, OUTCOMES, SettlementError, begin_settlement, run_settlement
+from trades import INTERVALS, load_candles, record_fills, render_chart
 
 # --- Configuration Loading ---
 load_dotenv()
@@ -12,119 +22,150 @@ TOKEN = os.getenv('DISCORD_TOKEN')
 
 with open('config.json', 'r') as f:
     config = json.load(f)
-    
-RANKED_ALLOWANCES = config['weekly_allowances']
-UNRANKED_ALLOWANCE = config['unranked_allowance']
+
 TIERS = {
     "7-Day Sprint": { "duration_days": 7, "founder_equity_pct": 0.50, "listing_fee": 25 },
     "30-Day Standard": { "duration_days": 30, "founder_equity_pct": 0.60, "listing_fee": 50 },
     "90-Day Marathon": { "duration_days": 90, "founder_equity_pct": 0.70, "listing_fee": 75 }
 }
-TRADING_FEE_PCT = 0.01
-TRADING_CHANNEL_ID = int(config['trading_channel_id'])
+STATS_EXPORT_PATH = config.get('stats_export_path')
+STATS_EXPORT_INTERVAL = 60
 
 # --- Bot Setup ---
 intents = discord.Intents.default()
 intents.members = True
-bot = discord.Bot(intents=intents)
-
-# --- Database Setup & Utility Functions ---
-# (These are unchanged)
-def setup_database():
-    conn = sqlite3.connect('economy.db')
-    cursor = conn.cursor()
-    cursor.execute("CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY, kcred_balance REAL DEFAULT 0, last_weekly_claim TEXT)")
-    cursor.execute("CREATE TABLE IF NOT EXISTS goals (ticker TEXT PRIMARY KEY, founder_id INTEGER, scenario TEXT, target_score TEXT, tier TEXT, ico_price REAL, status TEXT, initial_deadline TEXT, current_deadline TEXT, extension_round INTEGER DEFAULT 0, FOREIGN KEY (founder_id) REFERENCES users (user_id))")
-    cursor.execute("CREATE TABLE IF NOT EXISTS holdings (holding_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, ticker TEXT, amount INTEGER, asset_type TEXT DEFAULT 'TOKEN', FOREIGN KEY (user_id) REFERENCES users (user_id), FOREIGN KEY (ticker) REFERENCES goals (ticker))")
-    cursor.execute("CREATE TABLE IF NOT EXISTS orders (order_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, ticker TEXT, order_type TEXT, amount INTEGER, price_per_token REAL, status TEXT DEFAULT 'OPEN', FOREIGN KEY (user_id) REFERENCES users (user_id), FOREIGN KEY (ticker) REFERENCES goals (ticker))")
-    conn.commit()
-    conn.close()
+bot = discord.AutoShardedBot(intents=intents)
+stats = ExchangeStats()
+stats.instrument_http(bot.http)
+names = NameResolver(bot)
+
+
+class CommandError(Exception):
+    """Raised inside a transaction to abort it with a message for the user."""
+
+
+# --- Database Utility Functions ---
+HOLDING_UPSERT = "INSERT INTO holdings (user_id, ticker, amount) VALUES (?, ?, ?) ON CONFLICT (user_id, ticker) DO UPDATE SET amount = amount + excluded.amount"
 
-def get_user_balance(user_id):
-    conn = sqlite3.connect('economy.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT kcred_balance FROM users WHERE user_id = ?", (user_id,))
-    result = cursor.fetchone()
+def load_user_balance(conn, user_id):
+    result = conn.execute("SELECT kcred_balance FROM users WHERE user_id = ?", (user_id,)).fetchone()
     if not result:
-        cursor.execute("INSERT INTO users (user_id) VALUES (?)", (user_id,))
-        conn.commit()
-        conn.close()
+        conn.execute("INSERT INTO users (user_id) VALUES (?)", (user_id,))
         return 0
-    conn.close()
     return result[0]
 
+def ticker_autocomplete(*statuses):
+    """Suggest tickers in the given statuses (any if none) from the guild's in-memory index."""
+    async def suggest(actx: discord.AutocompleteContext):
+        guild_id = actx.interaction.guild_id
+        ex = exchanges.peek(guild_id)
+        if ex is None:
+            # Don't hold up the keystroke; suggestions start once the exchange is open
+            if guild_id is not None:
+                exchanges.warm(guild_id)
+            return []
+        return [
+            discord.OptionChoice(name=f"{ticker} · {ex.tickers.goals[ticker][0]} ({ex.tickers.goals[ticker][1]})"[:100], value=ticker)
+            for ticker in ex.tickers.search(actx.value or "", statuses or None)
+        ]
+    return suggest
+
 # --- Bot Events ---
 @bot.event
 async def on_ready():
     print(f'{bot.user} has connected to Discord!')
-    setup_database()
+    global stats_exporter
+    if STATS_EXPORT_PATH and stats_exporter is None:
+        stats_exporter = asyncio.create_task(export_stats())
+    # Exchanges open on first use; only arm each guild's next deadline up front
+    await exchanges.arm([guild.id for guild in bot.guilds])
+
+@bot.check
+async def guild_only(ctx):
+    # Every economy belongs to a guild; there is nothing to trade in DMs
+    return ctx.guild_id is not None
+
+@bot.event
+async def on_application_command_error(ctx, error):
+    if isinstance(error, discord.CheckFailure):
+        await ctx.respond("The exchange is only available inside a server.", ephemeral=True)
+        return
+    # after_invoke has already closed the command's scope and can't tell it failed
+    if hasattr(ctx, 'stats_scope'):
+        stats.record_error(ctx.command.qualified_name)
+    raise error
+
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.stats_scope = stats.enter(ctx.command.qualified_name)
+
+@bot.after_invoke
+async def stop_command_timer(ctx):
+    if hasattr(ctx, 'stats_scope'):
+        stats.exit(*ctx.stats_scope)
+
+# --- Instrumentation ---
+stats_exporter = None
+
+async def export_stats():
+    while True:
+        await asyncio.sleep(STATS_EXPORT_INTERVAL)
+        try:
+            stats.write_prometheus(STATS_EXPORT_PATH)
+        except OSError as e:
+            print(f"Could not write stats to {STATS_EXPORT_PATH}: {e}")
+
+def render_stats():
+    uptime = int(stats.uptime())
+    embed = discord.Embed(title="🛠️ Exchange Stats", description=f"Uptime: {uptime // 3600}h {uptime % 3600 // 60}m", color=discord.Color.dark_grey())
+    scopes, api_routes, counters = stats.snapshot()
+    rows = sorted(scopes.items(), key=lambda item: item[1].latency.total, reverse=True)[:15]
+    lines = [f"{'scope':<14}{'n':>6}{'p50':>7}{'p95':>7}{'q/n':>6}{'kvm/n':>7}{'api':>5}"]
+    for name, scope in rows:
+        n = scope.latency.total or 1
+        lines.append(f"{name[:14]:<14}{scope.latency.total:>6}{scope.latency.percentile(50):>7.0f}{scope.latency.percentile(95):>7.0f}{scope.queries / n:>6.1f}{scope.vm_steps / n / 1000:>7.1f}{scope.api_calls:>5}")
+    embed.add_field(name="Latency (ms) by Command", value="```\n" + "\n".join(lines) + "\n```", inline=False)
+    embed.add_field(name="Database", value="\n".join(
+        f"**{kind}:** {h.total:,} calls, p50 {h.percentile(50):.0f}ms, p95 {h.percentile(95):.0f}ms" for kind, h in stats.query_latency.items()
+    ), inline=False)
+    embed.add_field(name="Matching", value=(
+        f"**Passes:** {counters.get('matching_passes', 0):,}\n"
+        f"**Loop iterations:** {counters.get('matching_iterations', 0):,}\n"
+        f"**Fills:** {counters.get('fills', 0):,}"
+    ), inline=True)
+    top_routes = sorted(api_routes.items(), key=lambda item: item[1], reverse=True)[:5]
+    embed.add_field(name=f"Discord API ({sum(api_routes.values()):,} calls)", value="\n".join(f"`{route}`: {count:,}" for route, count in top_routes) or "None yet", inline=True)
+    embed.set_footer(text="Latencies are histogram bucket upper bounds. kvm/n = thousands of SQLite VM steps per call.")
+    return embed
+
+@bot.slash_command(name="exchange_stats", description="[Admin] View exchange performance statistics.", default_member_permissions=discord.Permissions(administrator=True))
+async def exchange_stats(ctx):
+    await ctx.defer(ephemeral=True)
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.followup.send("Only administrators can view exchange stats.")
+        return
+    if STATS_EXPORT_PATH:
+        stats.write_prometheus(STATS_EXPORT_PATH)
+    await ctx.followup.send(embed=render_stats())
 
 # --- NEW AND IMPROVED /market COMMAND ---
 
 @bot.slash_command(name="market", description="View all active goals on the exchange.")
 async def market(ctx):
     await ctx.defer()
-    conn = sqlite3.connect('economy.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    ex = await exchanges.get(ctx.guild_id)
 
-    # Fetch all goals that are either in ICO or actively trading
-    cursor.execute("SELECT * FROM goals WHERE status IN ('ICO', 'ACTIVE')")
-    all_goals = cursor.fetchall()
+    # Listings are cached until a mint, ICO buy, listing or status change; quotes come live from the books
+    market_pages = await ex.market.pages()
 
-    if not all_goals:
+    if not market_pages:
         await ctx.followup.send("The market is currently empty. Be the first to `/mint` a new goal!")
-        conn.close()
         return
 
-    embed = discord.Embed(title="📈 TSK Score Exchange Market", color=discord.Color.gold())
-    
-    for goal in all_goals:
-        status = goal['status']
-        ticker = goal['ticker']
-        
-        info_text = ""
-        
-        if status == 'ICO':
-            cursor.execute("SELECT SUM(amount) FROM holdings WHERE ticker = ?", (ticker,))
-            tokens_sold = cursor.fetchone()[0] or 0
-            tokens_available = 100 - tokens_sold
-            
-            price = goal['ico_price']
-            info_text = (
-                f"**Price:** ✨ {price:,.2f} / token\n"
-                f"**Available:** {tokens_available} tokens remaining"
-            )
-            
-        elif status == 'ACTIVE':
-            # Get lowest ask (sell order)
-            cursor.execute("SELECT MIN(price_per_token) FROM orders WHERE ticker = ? AND order_type = 'SELL' AND status = 'OPEN'", (ticker,))
-            lowest_ask = cursor.fetchone()[0]
-            
-            # Get highest bid (buy order)
-            cursor.execute("SELECT MAX(price_per_token) FROM orders WHERE ticker = ? AND order_type = 'BUY' AND status = 'OPEN'", (ticker,))
-            highest_bid = cursor.fetchone()[0]
-            
-            ask_text = f"✨ {lowest_ask:,.2f}" if lowest_ask else "N/A"
-            bid_text = f"✨ {highest_bid:,.2f}" if highest_bid else "N/A"
-            
-            info_text = f"**Lowest Ask:** {ask_text}\n**Highest Bid:** {bid_text}"
-
-        founder = await bot.fetch_user(goal['founder_id'])
-        
-        embed.add_field(
-            name=f"`{ticker}` ({status}) - Founded by {founder.name}",
-            value=(
-                f"**Goal:** {goal['target_score']} in *{goal['scenario']}*\n"
-                f"{info_text}\n"
-                f"**Closes:** <t:{int(datetime.fromisoformat(goal['current_deadline']).timestamp())}:R>"
-            ),
-            inline=False
-        )
-    
-    conn.close()
-    embed.set_footer(text="Use /view <ticker> for more details or /orderbook <ticker> to see all orders.")
-    await ctx.followup.send(embed=embed)
+    if len(market_pages) == 1:
+        await ctx.followup.send(embed=market_pages[0])
+        return
+    await Paginator(pages=market_pages).respond(ctx.interaction)
 
 
 # --- All other commands remain the same ---
@@ -132,52 +173,69 @@ async def market(ctx):
 
 @bot.slash_command(name="profile", description="Check a member's Aura balance, holdings, and open orders.")
 async def profile(ctx, member: discord.Member = None):
-    await ctx.defer() 
-    target_member = member or ctx.author
-    balance = get_user_balance(target_member.id)
-    embed = discord.Embed(title=f"{target_member.display_name}'s Profile", color=discord.Color.blue()).set_thumbnail(url=target_member.display_avatar.url)
-    embed.add_field(name="Aura Balance", value=f"✨ {balance:,.2f}", inline=False)
-    conn = sqlite3.connect('economy.db'); conn.row_factory = sqlite3.Row; cursor = conn.cursor()
-    cursor.execute("SELECT ticker, amount FROM holdings WHERE user_id = ? AND asset_type = 'TOKEN' AND amount > 0", (target_member.id,))
-    holdings = cursor.fetchall()
-    if holdings:
-        embed.add_field(name="Active Holdings", value="\n".join([f"`{h['ticker']}`: **{h['amount']}** tokens" for h in holdings]), inline=False)
-    cursor.execute("SELECT order_id, ticker, order_type, amount, price_per_token FROM orders WHERE user_id = ? AND status = 'OPEN'", (target_member.id,))
-    orders = cursor.fetchall()
-    if orders:
-        embed.add_field(name="Open Orders", value="\n".join([f"ID:`{o['order_id']}` {o['order_type']} `{o['ticker']}`: **{o['amount']}** @ ✨{o['price_per_token']:.2f}" for o in orders]), inline=False)
-        embed.set_footer(text="Use /cancel_order <order_id> to cancel an order.")
-    conn.close()
-    await ctx.followup.send(embed=embed)
+    await ctx.defer()
+    ex = await exchanges.get(ctx.guild_id)
+    pages = await ex.portfolios.pages(member or ctx.author)
+    if len(pages) == 1:
+        await ctx.followup.send(embed=pages[0])
+        return
+    await Paginator(pages=pages).respond(ctx.interaction)
 
 
-@bot.slash_command(name="weekly", description="Claim your weekly Aura allowance based on your highest rank.")
-async def weekly(ctx):
-    await ctx.defer(ephemeral=True)
-    user_id = ctx.author.id
-    conn = sqlite3.connect('economy.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT last_weekly_claim FROM users WHERE user_id = ?", (user_id,))
-    result = cursor.fetchone()
+def claim_weekly(conn, ex, user_id, allowance):
+    result = conn.execute("SELECT last_weekly_claim FROM users WHERE user_id = ?", (user_id,)).fetchone()
     if result and result[0]:
         last_claim_time = datetime.fromisoformat(result[0])
         if datetime.utcnow() < last_claim_time + timedelta(days=7):
             time_left = (last_claim_time + timedelta(days=7)) - datetime.utcnow()
             days, rem = divmod(time_left.total_seconds(), 86400); hours, rem = divmod(rem, 3600); minutes, _ = divmod(rem, 60)
-            await ctx.followup.send(f"You've already claimed your weekly allowance. Please wait {int(days)}d {int(hours)}h {int(minutes)}m.")
-            conn.close()
-            return
-    allowance = UNRANKED_ALLOWANCE
-    user_roles = [role.name for role in ctx.author.roles]
-    for rank in RANKED_ALLOWANCES:
-        if rank['role_name'] in user_roles: allowance = rank['amount']; break
+            raise CommandError(f"You've already claimed your weekly allowance. Please wait {int(days)}d {int(hours)}h {int(minutes)}m.")
+    load_user_balance(conn, user_id)
     conn.execute("UPDATE users SET kcred_balance = kcred_balance + ?, last_weekly_claim = ? WHERE user_id = ?", (allowance, datetime.utcnow().isoformat(), user_id))
+    journal.record(conn, 'ALLOWANCE', user_id=user_id, amount=allowance)
     conn.commit()
-    conn.close()
-    new_balance = get_user_balance(user_id)
+    ex.rankings.refresh(conn, [user_id])
+    ex.portfolios.invalidate([user_id])
+    return load_user_balance(conn, user_id)
+
+@bot.slash_command(name="weekly", description="Claim your weekly Aura allowance based on your highest rank.")
+async def weekly(ctx):
+    await ctx.defer(ephemeral=True)
+    ex = await exchanges.get(ctx.guild_id)
+    user_id = ctx.author.id
+    allowance = ex.settings['unranked_allowance']
+    user_roles = [role.name for role in ctx.author.roles]
+    for rank in ex.settings['weekly_allowances']:
+        if rank['role_name'] in user_roles: allowance = rank['amount']; break
+    try:
+        new_balance = await ex.db.write(claim_weekly, ex, user_id, allowance)
+    except CommandError as e:
+        await ctx.followup.send(str(e))
+        return
     await ctx.followup.send(f"You have claimed your weekly allowance of **✨ {allowance:,.2f}**! Your new balance is **✨ {new_balance:,.2f}**.")
 
 
+def create_goal(conn, ex, founder_id, ticker, scenario, target_score, tier, ico_price, deadline, founder_tokens, auction_interval=None):
+    listing_fee = TIERS[tier]['listing_fee']
+    if load_user_balance(conn, founder_id) < listing_fee:
+        raise CommandError(f"You cannot afford the **✨ {listing_fee:,}** listing fee for this tier.")
+    try:
+        conn.execute("UPDATE users SET kcred_balance = kcred_balance - ? WHERE user_id = ?", (listing_fee, founder_id))
+        conn.execute("""
+            INSERT INTO goals (ticker, founder_id, scenario, target_score, tier, ico_price, status, initial_deadline, current_deadline, auction_interval)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (ticker, founder_id, scenario, target_score, tier, ico_price, 'ICO', deadline.isoformat(), deadline.isoformat(), auction_interval))
+        conn.execute("INSERT INTO holdings (user_id, ticker, amount) VALUES (?, ?, ?)", (founder_id, ticker, founder_tokens))
+    except sqlite3.IntegrityError:
+        raise CommandError("A goal with a very similar name already exists. Please try a more unique name.")
+    journal.record(conn, 'MINT', user_id=founder_id, ticker=ticker, amount=founder_tokens, price=ico_price, data={
+        "fee": listing_fee, "scenario": scenario, "target_score": target_score, "tier": tier, "deadline": deadline.isoformat(), "auction_interval": auction_interval,
+    })
+    conn.commit()
+    ex.rankings.mark(ticker, ico_price)
+    ex.rankings.refresh(conn, [founder_id])
+    ex.portfolios.invalidate([founder_id])
+
 @bot.slash_command(name="mint", description="Mint a new goal token and start an ICO.")
 async def mint(ctx,
     tier: Annotated[str, discord.Option(str, description="Choose the goal duration tier", choices=list(TIERS.keys()))],
@@ -186,13 +244,9 @@ async def mint(ctx,
     total_auras_to_raise: Annotated[float, discord.Option(float, description="The total amount of Auras you want to raise from investors")]
 ):
     await ctx.defer()
+    ex = await exchanges.get(ctx.guild_id)
     founder_id = ctx.author.id
     tier_details = TIERS[tier]
-    
-    founder_balance = get_user_balance(founder_id)
-    if founder_balance < tier_details['listing_fee']:
-        await ctx.followup.send(f"You cannot afford the **✨ {tier_details['listing_fee']:,}** listing fee for this tier.", ephemeral=True)
-        return
 
     scenario_abbr = "".join([word[0] for word in scenario.split()]).upper()
     ticker = f"{ctx.author.name.upper()[:4]}-{scenario_abbr}-{target_score}"
@@ -204,25 +258,19 @@ async def mint(ctx,
     if ico_tokens <= 0:
         await ctx.followup.send("This tier does not offer any tokens for public sale.", ephemeral=True)
         return
-        
+
     ico_price = total_auras_to_raise / ico_tokens
+    auction_interval = ex.settings['auction_intervals'].get(tier)
 
-    conn = sqlite3.connect('economy.db')
-    cursor = conn.cursor()
     try:
-        conn.execute("UPDATE users SET kcred_balance = kcred_balance - ? WHERE user_id = ?", (tier_details['listing_fee'], founder_id))
-        cursor.execute("""
-            INSERT INTO goals (ticker, founder_id, scenario, target_score, tier, ico_price, status, initial_deadline, current_deadline)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (ticker, founder_id, scenario, target_score, tier, ico_price, 'ICO', deadline.isoformat(), deadline.isoformat()))
-        cursor.execute("INSERT INTO holdings (user_id, ticker, amount) VALUES (?, ?, ?)", (founder_id, ticker, founder_tokens))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        await ctx.followup.send("A goal with a very similar name already exists. Please try a more unique name.", ephemeral=True)
-        conn.close()
+        await ex.db.write(create_goal, ex, founder_id, ticker, scenario, target_score, tier, ico_price, deadline, founder_tokens, auction_interval)
+    except CommandError as e:
+        await ctx.followup.send(str(e), ephemeral=True)
         return
-    finally:
-        conn.close()
+    ex.market.bump()
+    ex.deadlines.schedule(ticker, deadline)
+    ex.tickers.add(ticker, scenario, 'ICO')
+    ex.matcher.set_interval(ticker, auction_interval)
 
     embed = discord.Embed(
         title="📢 New Initial Coin Offering (ICO)!",
@@ -236,78 +284,93 @@ async def mint(ctx,
     embed.add_field(name="Total Funding Goal", value=f"✨ {total_auras_to_raise:,.2f}", inline=True)
     embed.add_field(name="Implied Price/Token", value=f"✨ {ico_price:,.2f}", inline=True)
     embed.set_footer(text=f"Use /buy_ico {ticker} <amount> to invest.")
-    
+
     await ctx.followup.send(embed=embed)
 
 
-@bot.slash_command(name="buy_ico", description="Buy tokens during an active ICO.")
-async def buy_ico(ctx, 
-    ticker: Annotated[str, discord.Option(str, description="The ticker symbol of the goal you want to invest in")],
-    amount: Annotated[int, discord.Option(int, description="The number of tokens you want to buy")]
-):
-    await ctx.defer()
-    investor_id = ctx.author.id
-    ticker = ticker.upper()
-    if amount <= 0:
-        await ctx.followup.send("You must buy a positive number of tokens.", ephemeral=True)
-        return
-
-    conn = sqlite3.connect('economy.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT founder_id, ico_price, status FROM goals WHERE ticker = ? AND status = 'ICO'", (ticker,))
-    goal = cursor.fetchone()
+def purchase_ico(conn, ex, investor_id, ticker, amount):
+    goal = conn.execute("SELECT founder_id, ico_price, status FROM goals WHERE ticker = ? AND status = 'ICO'", (ticker,)).fetchone()
     if not goal:
-        await ctx.followup.send(f"No active ICO found for ticker `{ticker}`.", ephemeral=True)
-        conn.close()
-        return
-        
+        raise CommandError(f"No active ICO found for ticker `{ticker}`.")
+
     founder_id, ico_price, _ = goal
     if investor_id == founder_id:
-        await ctx.followup.send("You cannot invest in your own ICO.", ephemeral=True)
-        conn.close()
-        return
+        raise CommandError("You cannot invest in your own ICO.")
 
-    cursor.execute("SELECT SUM(amount) FROM holdings WHERE ticker = ?", (ticker,))
-    tokens_owned = cursor.fetchone()[0] or 0
+    tokens_owned = conn.execute("SELECT SUM(amount) FROM holdings WHERE ticker = ?", (ticker,)).fetchone()[0] or 0
     tokens_for_sale = 100 - tokens_owned
     if amount > tokens_for_sale:
-        await ctx.followup.send(f"There are only {tokens_for_sale} tokens left in this ICO. You cannot buy {amount}.", ephemeral=True)
-        conn.close()
-        return
-        
+        raise CommandError(f"There are only {tokens_for_sale} tokens left in this ICO. You cannot buy {amount}.")
+
     total_cost = amount * ico_price
-    investor_balance = get_user_balance(investor_id)
+    investor_balance = load_user_balance(conn, investor_id)
     if investor_balance < total_cost:
-        await ctx.followup.send(f"You cannot afford this purchase. You need **✨ {total_cost:,.2f}** but only have **✨ {investor_balance:,.2f}**.", ephemeral=True)
-        conn.close()
+        raise CommandError(f"You cannot afford this purchase. You need **✨ {total_cost:,.2f}** but only have **✨ {investor_balance:,.2f}**.")
+
+    conn.execute("UPDATE users SET kcred_balance = kcred_balance - ? WHERE user_id = ?", (total_cost, investor_id))
+    conn.execute("UPDATE users SET kcred_balance = kcred_balance + ? WHERE user_id = ?", (total_cost, founder_id))
+    conn.execute(HOLDING_UPSERT, (investor_id, ticker, amount))
+    journal.record(conn, 'ICO', user_id=investor_id, ticker=ticker, amount=amount, price=ico_price, ref=founder_id)
+    conn.commit()
+    ex.rankings.refresh(conn, [investor_id, founder_id])
+    ex.portfolios.invalidate([investor_id, founder_id])
+    return total_cost
+
+@bot.slash_command(name="buy_ico", description="Buy tokens during an active ICO.")
+async def buy_ico(ctx,
+    ticker: Annotated[str, discord.Option(str, description="The ticker symbol of the goal you want to invest in", autocomplete=ticker_autocomplete('ICO'))],
+    amount: Annotated[int, discord.Option(int, description="The number of tokens you want to buy")]
+):
+    await ctx.defer()
+    ex = await exchanges.get(ctx.guild_id)
+    investor_id = ctx.author.id
+    ticker = ticker.upper()
+    if amount <= 0:
+        await ctx.followup.send("You must buy a positive number of tokens.", ephemeral=True)
         return
 
     try:
-        conn.execute("UPDATE users SET kcred_balance = kcred_balance - ? WHERE user_id = ?", (total_cost, investor_id))
-        conn.execute("UPDATE users SET kcred_balance = kcred_balance + ? WHERE user_id = ?", (total_cost, founder_id))
-        cursor.execute("SELECT holding_id FROM holdings WHERE user_id = ? AND ticker = ?", (investor_id, ticker))
-        existing_holding = cursor.fetchone()
-        if existing_holding:
-            cursor.execute("UPDATE holdings SET amount = amount + ? WHERE holding_id = ?", (amount, existing_holding[0]))
-        else:
-            cursor.execute("INSERT INTO holdings (user_id, ticker, amount) VALUES (?, ?, ?)", (investor_id, ticker, amount))
-        conn.commit()
+        total_cost = await ex.db.write(purchase_ico, ex, investor_id, ticker, amount)
+    except CommandError as e:
+        await ctx.followup.send(str(e), ephemeral=True)
+        return
     except Exception as e:
-        conn.rollback()
         await ctx.followup.send(f"An error occurred: {e}", ephemeral=True)
-    finally:
-        conn.close()
+        return
+    ex.market.bump()
 
     await ctx.followup.send(f"**Success!** {ctx.author.mention} has purchased **{amount}** `{ticker}` tokens for **✨ {total_cost:,.2f}**.")
 
 
+def trading_status(conn, ticker):
+    status_res = conn.execute("SELECT status FROM goals WHERE ticker = ?", (ticker,)).fetchone()
+    if not status_res or status_res[0] != 'ACTIVE':
+        raise CommandError(f"`{ticker}` is not currently available for open market trading. Its status is: `{status_res[0] if status_res else 'UNKNOWN'}`.")
+
+def place_sell_order(conn, ex, seller_id, ticker, amount, price):
+    holding = conn.execute("SELECT amount FROM holdings WHERE user_id = ? AND ticker = ? AND asset_type = 'TOKEN'", (seller_id, ticker)).fetchone()
+    if not holding or holding[0] < amount:
+        raise CommandError(f"You don't have enough `{ticker}` tokens to sell. You have {holding[0] if holding else 0}.")
+
+    conn.execute("UPDATE goals SET status = 'ACTIVE' WHERE ticker = ? AND status = 'ICO'", (ticker,))
+    trading_status(conn, ticker)
+
+    conn.execute("UPDATE holdings SET amount = amount - ? WHERE user_id = ? AND ticker = ?", (amount, seller_id, ticker))
+    cursor = conn.execute("INSERT INTO orders (user_id, ticker, order_type, amount, price_per_token) VALUES (?, ?, ?, ?, ?)",
+                          (seller_id, ticker, 'SELL', amount, price))
+    journal.record(conn, 'SELL', user_id=seller_id, ticker=ticker, order_id=cursor.lastrowid, amount=amount, price=price)
+    conn.commit()
+    ex.books.add(Order(cursor.lastrowid, seller_id, ticker, 'SELL', amount, price))
+    ex.portfolios.invalidate([seller_id])
+
 @bot.slash_command(name="sell", description="Place tokens for sale on the open market.")
-async def sell(ctx, 
-    ticker: Annotated[str, discord.Option(str, description="The ticker of the tokens you want to sell")],
+async def sell(ctx,
+    ticker: Annotated[str, discord.Option(str, description="The ticker of the tokens you want to sell", autocomplete=ticker_autocomplete('ICO', 'ACTIVE'))],
     amount: Annotated[int, discord.Option(int, description="The number of tokens to sell")],
     price: Annotated[float, discord.Option(float, description="The price per token in Auras")]
 ):
     await ctx.defer()
+    ex = await exchanges.get(ctx.guild_id)
     seller_id = ctx.author.id
     ticker = ticker.upper()
 
@@ -315,100 +378,165 @@ async def sell(ctx,
         await ctx.followup.send("Amount and price must be positive numbers.", ephemeral=True)
         return
 
-    conn = sqlite3.connect('economy.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT amount FROM holdings WHERE user_id = ? AND ticker = ? AND asset_type = 'TOKEN'", (seller_id, ticker))
-    holding = cursor.fetchone()
-    if not holding or holding[0] < amount:
-        await ctx.followup.send(f"You don't have enough `{ticker}` tokens to sell. You have {holding[0] if holding else 0}.", ephemeral=True)
-        conn.close()
+    try:
+        await ex.db.write(place_sell_order, ex, seller_id, ticker, amount, price)
+    except CommandError as e:
+        await ctx.followup.send(str(e), ephemeral=True)
         return
+    if ex.tickers.set_status(ticker, 'ACTIVE', only_from=('ICO',)):
+        ex.market.bump()  # The listing moves from its ICO to the open market
+    ex.matcher.trigger(ticker)
+    await ctx.followup.send(f"{ctx.author.mention} has placed **{amount}** `{ticker}` tokens for sale at **✨ {price:,.2f}** each.")
 
-    cursor.execute("SELECT status FROM goals WHERE ticker = ?", (ticker,))
-    status_res = cursor.fetchone()
-    
-    if status_res and status_res[0] == 'ICO':
-        cursor.execute("UPDATE goals SET status = 'ACTIVE' WHERE ticker = ?", (ticker,))
-        conn.commit()
-        cursor.execute("SELECT status FROM goals WHERE ticker = ?", (ticker,))
-        status_res = cursor.fetchone()
 
-    if not status_res or status_res[0] != 'ACTIVE':
-        await ctx.followup.send(f"`{ticker}` is not currently available for open market trading. Its status is: `{status_res[0] if status_res else 'UNKNOWN'}`.", ephemeral=True)
-        conn.close()
-        return
-
-    cursor.execute("UPDATE holdings SET amount = amount - ? WHERE user_id = ? AND ticker = ?", (amount, seller_id, ticker))
-    cursor.execute("INSERT INTO orders (user_id, ticker, order_type, amount, price_per_token) VALUES (?, ?, ?, ?, ?)",
-                   (seller_id, ticker, 'SELL', amount, price))
+def place_buy_order(conn, ex, buyer_id, ticker, amount, price):
+    total_cost = amount * price
+    buyer_balance = load_user_balance(conn, buyer_id)
+    if buyer_balance < total_cost:
+        raise CommandError(f"You cannot afford this buy order. You need **✨ {total_cost:,.2f}** to cover the maximum cost, but only have **✨ {buyer_balance:,.2f}**.")
+    trading_status(conn, ticker)
+    conn.execute("UPDATE users SET kcred_balance = kcred_balance - ?, reserved = reserved + ? WHERE user_id = ?", (total_cost, total_cost, buyer_id))
+    cursor = conn.execute("INSERT INTO orders (user_id, ticker, order_type, amount, price_per_token) VALUES (?, ?, ?, ?, ?)",
+                          (buyer_id, ticker, 'BUY', amount, price))
+    journal.record(conn, 'BUY', user_id=buyer_id, ticker=ticker, order_id=cursor.lastrowid, amount=amount, price=price)
     conn.commit()
-    conn.close()
-    
-    await ctx.followup.send(f"{ctx.author.mention} has placed **{amount}** `{ticker}` tokens for sale at **✨ {price:,.2f}** each.")
-    await match_orders(bot, ticker)
-
+    ex.books.add(Order(cursor.lastrowid, buyer_id, ticker, 'BUY', amount, price))
+    ex.portfolios.invalidate([buyer_id])
 
 @bot.slash_command(name="buy", description="Place a buy order for tokens on the open market.")
-async def buy(ctx, 
-    ticker: Annotated[str, discord.Option(str, description="The ticker of the tokens you want to buy")],
+async def buy(ctx,
+    ticker: Annotated[str, discord.Option(str, description="The ticker of the tokens you want to buy", autocomplete=ticker_autocomplete('ACTIVE'))],
     amount: Annotated[int, discord.Option(int, description="The number of tokens to buy")],
     price: Annotated[float, discord.Option(float, description="The maximum price you're willing to pay per token")]
 ):
     await ctx.defer()
+    ex = await exchanges.get(ctx.guild_id)
     buyer_id = ctx.author.id
     ticker = ticker.upper()
 
     if amount <= 0 or price <= 0:
         await ctx.followup.send("Amount and price must be positive numbers.", ephemeral=True)
         return
-        
-    total_cost = amount * price
-    buyer_balance = get_user_balance(buyer_id)
-    if buyer_balance < total_cost:
-        await ctx.followup.send(f"You cannot afford this buy order. You need **✨ {total_cost:,.2f}** to cover the maximum cost, but only have **✨ {buyer_balance:,.2f}**.", ephemeral=True)
-        return
-        
-    conn = sqlite3.connect('economy.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT status FROM goals WHERE ticker = ?", (ticker,))
-    status_res = cursor.fetchone()
-    if not status_res or status_res[0] != 'ACTIVE':
-        await ctx.followup.send(f"`{ticker}` is not currently available for open market trading. Its status is: `{status_res[0] if status_res else 'UNKNOWN'}`.", ephemeral=True)
-        conn.close()
-        return
 
     try:
-        cursor.execute("INSERT INTO orders (user_id, ticker, order_type, amount, price_per_token) VALUES (?, ?, ?, ?, ?)",
-                       (buyer_id, ticker, 'BUY', amount, price))
-        conn.commit()
-    finally:
-        conn.close()
+        await ex.db.write(place_buy_order, ex, buyer_id, ticker, amount, price)
+    except CommandError as e:
+        await ctx.followup.send(str(e), ephemeral=True)
+        return
 
+    ex.matcher.trigger(ticker)
     await ctx.followup.send(f"{ctx.author.mention} has placed a buy order for **{amount}** `{ticker}` tokens at a max price of **✨ {price:,.2f}** each.")
-    await match_orders(bot, ticker)
+
+
+MAX_LADDER_LEVELS = 25
+MAX_LEVEL_AMOUNT = 100  # A goal only ever has 100 tokens
+MAX_LEVEL_PRICE = 1_000_000
+
+def parse_ladder(text):
+    """Parse "buy 5@9.50, sell 3@11" into (side, amount, price) levels."""
+    levels = []
+    for part in text.replace(";", ",").split(","):
+        if not part.strip():
+            continue
+        try:
+            side, quote = part.split()
+            amount, price = quote.split("@")
+            level = ({'BUY': 'BUY', 'B': 'BUY', 'SELL': 'SELL', 'S': 'SELL'}[side.upper()], int(amount), float(price))
+        except (KeyError, ValueError):
+            raise CommandError(f"Could not read the level `{part.strip()}`. Use the form `buy 5@9.50, sell 3@11`.")
+        if level[1] <= 0 or not math.isfinite(level[2]) or level[2] <= 0:
+            raise CommandError(f"Amount and price must be positive numbers (`{part.strip()}`).")
+        if level[1] > MAX_LEVEL_AMOUNT or level[2] > MAX_LEVEL_PRICE:
+            raise CommandError(f"Levels are limited to {MAX_LEVEL_AMOUNT} tokens at up to ✨ {MAX_LEVEL_PRICE:,} each (`{part.strip()}`).")
+        levels.append(level)
+    if not levels:
+        raise CommandError("Give at least one level, e.g. `buy 5@9.50, sell 3@11`.")
+    if len(levels) > MAX_LADDER_LEVELS:
+        raise CommandError(f"A ladder can have at most {MAX_LADDER_LEVELS} levels.")
+    return levels
+
+def place_orders(conn, ex, user_id, ticker, levels):
+    """Place many (side, amount, price) orders on one ticker in one transaction."""
+    sells = [level for level in levels if level[0] == 'SELL']
+    buys = [level for level in levels if level[0] == 'BUY']
+    if sells and buys and max(price for _, _, price in buys) >= min(price for _, _, price in sells):
+        raise CommandError("Your bids must all be priced below your asks.")
+    sell_amount = sum(amount for _, amount, _ in sells)
+    buy_cost = sum(amount * price for _, amount, price in buys)
+
+    if sells:
+        holding = conn.execute("SELECT amount FROM holdings WHERE user_id = ? AND ticker = ? AND asset_type = 'TOKEN'", (user_id, ticker)).fetchone()
+        if not holding or holding[0] < sell_amount:
+            raise CommandError(f"You don't have enough `{ticker}` tokens to sell {sell_amount}. You have {holding[0] if holding else 0}.")
+        conn.execute("UPDATE goals SET status = 'ACTIVE' WHERE ticker = ? AND status = 'ICO'", (ticker,))
+    if buys:
+        balance = load_user_balance(conn, user_id)
+        if balance < buy_cost:
+            raise CommandError(f"You cannot afford these bids. You need **✨ {buy_cost:,.2f}** to cover the maximum cost, but only have **✨ {balance:,.2f}**.")
+    trading_status(conn, ticker)
+
+    if sells:
+        conn.execute("UPDATE holdings SET amount = amount - ? WHERE user_id = ? AND ticker = ?", (sell_amount, user_id, ticker))
+    if buys:
+        conn.execute("UPDATE users SET kcred_balance = kcred_balance - ?, reserved = reserved + ? WHERE user_id = ?", (buy_cost, buy_cost, user_id))
+    conn.executemany("INSERT INTO orders (user_id, ticker, order_type, amount, price_per_token) VALUES (?, ?, ?, ?, ?)",
+                     [(user_id, ticker, side, amount, price) for side, amount, price in levels])
+    # Only the writer thread inserts, so the batch got consecutive ids
+    last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+    placed = [(order_id, side, amount, price) for order_id, (side, amount, price) in enumerate(levels, start=last_id - len(levels) + 1)]
+    journal.record_orders(conn, user_id, ticker, placed)
+    conn.commit()
+    for order_id, side, amount, price in placed:
+        ex.books.add(Order(order_id, user_id, ticker, side, amount, price))
+    ex.portfolios.invalidate([user_id])
+
+@bot.slash_command(name="ladder", description="Place several buy and sell orders on one token at once.")
+async def ladder(ctx,
+    ticker: Annotated[str, discord.Option(str, description="The ticker of the tokens you want to quote", autocomplete=ticker_autocomplete('ICO', 'ACTIVE'))],
+    levels: Annotated[str, discord.Option(str, description="Comma separated levels, e.g. buy 5@9.50, buy 5@9, sell 5@11")]
+):
+    await ctx.defer()
+    ex = await exchanges.get(ctx.guild_id)
+    ticker = ticker.upper()
+    try:
+        parsed = parse_ladder(levels)
+        await ex.db.write(place_orders, ex, ctx.author.id, ticker, parsed)
+    except CommandError as e:
+        await ctx.followup.send(str(e), ephemeral=True)
+        return
+    if any(side == 'SELL' for side, _, _ in parsed) and ex.tickers.set_status(ticker, 'ACTIVE', only_from=('ICO',)):
+        ex.market.bump()
+
+    # One matching pass for the whole ladder
+    ex.matcher.trigger(ticker)
+    bids = sorted((level for level in parsed if level[0] == 'BUY'), key=lambda level: -level[2])
+    asks = sorted((level for level in parsed if level[0] == 'SELL'), key=lambda level: level[2])
+    embed = discord.Embed(title=f"Ladder placed on `{ticker}`", description=f"{ctx.author.mention} placed **{len(parsed)}** order(s).", color=discord.Color.orange())
+    if asks:
+        embed.add_field(name="🔴 Asks", value="\n".join(f"✨ {price:,.2f} - **{amount}** tokens" for _, amount, price in asks), inline=True)
+    if bids:
+        embed.add_field(name="🟢 Bids", value="\n".join(f"✨ {price:,.2f} - **{amount}** tokens" for _, amount, price in bids), inline=True)
+    await ctx.followup.send(embed=embed)
 
 
 @bot.slash_command(name="view", description="View detailed information about a specific goal/token.")
-async def view(ctx, ticker: str):
+async def view(ctx, ticker: Annotated[str, discord.Option(str, description="The ticker of the goal you want to view", autocomplete=ticker_autocomplete())]):
     await ctx.defer()
+    ex = await exchanges.get(ctx.guild_id)
     ticker = ticker.upper()
-    conn = sqlite3.connect('economy.db')
-    cursor = conn.cursor()
-    cursor.execute("SELECT founder_id, scenario, target_score, tier, ico_price, status, current_deadline FROM goals WHERE ticker = ?", (ticker,))
-    goal = cursor.fetchone()
-    conn.close()
+    goal = await ex.db.fetchone("SELECT founder_id, scenario, target_score, tier, ico_price, status, current_deadline FROM goals WHERE ticker = ?", (ticker,))
 
     if not goal:
         await ctx.respond(f"No goal found with ticker `{ticker}`.", ephemeral=True)
         return
-        
+
     founder_id, scenario, target_score, tier, ico_price, status, deadline_str = goal
-    founder = await bot.fetch_user(founder_id)
+    founder_name = await names.resolve(founder_id)
     deadline = datetime.fromisoformat(deadline_str)
 
     embed = discord.Embed(
         title=f"Token Information: `{ticker}`",
-        description=f"Founded by **{founder.name}**",
+        description=f"Founded by **{founder_name}**",
         color=discord.Color.dark_purple()
     )
     embed.add_field(name="Goal", value=f"**{target_score}** in *{scenario}*", inline=False)
@@ -416,110 +544,242 @@ async def view(ctx, ticker: str):
     embed.add_field(name="Tier", value=tier, inline=True)
     embed.add_field(name="Deadline", value=f"<t:{int(deadline.timestamp())}:R>", inline=True)
     embed.add_field(name="ICO Price", value=f"✨ {ico_price:,.2f}", inline=True)
-    
+
     await ctx.followup.send(embed=embed)
 
 
 @bot.slash_command(name="orderbook", description="View the current buy and sell orders for a token.")
-async def orderbook(ctx, ticker: Annotated[str, discord.Option(str, description="The ticker of the market you want to view")]):
+async def orderbook(ctx, ticker: Annotated[str, discord.Option(str, description="The ticker of the market you want to view", autocomplete=ticker_autocomplete())]):
     await ctx.defer()
+    ex = await exchanges.get(ctx.guild_id)
     ticker = ticker.upper()
-    conn = sqlite3.connect('economy.db'); conn.row_factory = sqlite3.Row; cursor = conn.cursor()
-    cursor.execute("SELECT price_per_token, SUM(amount) as total_amount FROM orders WHERE ticker = ? AND order_type = 'SELL' AND status = 'OPEN' GROUP BY price_per_token ORDER BY price_per_token ASC", (ticker,))
-    sell_orders = cursor.fetchall()
-    cursor.execute("SELECT price_per_token, SUM(amount) as total_amount FROM orders WHERE ticker = ? AND order_type = 'BUY' AND status = 'OPEN' GROUP BY price_per_token ORDER BY price_per_token DESC", (ticker,))
-    buy_orders = cursor.fetchall()
-    conn.close()
-    embed = discord.Embed(title=f"Order Book for `{ticker}`", color=discord.Color.orange())
-    sell_text = "\n".join([f"✨ {s['price_per_token']:.2f} - **{s['total_amount']}** tokens" for s in sell_orders]) or "No open sell orders"
-    embed.add_field(name="🔴 Asks (Sellers)", value=sell_text, inline=True)
-    buy_text = "\n".join([f"✨ {b['price_per_token']:.2f} - **{b['total_amount']}** tokens" for b in buy_orders]) or "No open buy orders"
-    embed.add_field(name="🟢 Bids (Buyers)", value=buy_text, inline=True)
-    await ctx.followup.send(embed=embed)
+    await ctx.followup.send(embed=ex.depth.embed(ticker))
+
+
+@bot.slash_command(name="chart", description="View price history for a token.")
+async def chart(ctx,
+    ticker: Annotated[str, discord.Option(str, description="The ticker of the market you want to chart", autocomplete=ticker_autocomplete())],
+    interval: Annotated[str, discord.Option(str, description="Candle size", choices=list(INTERVALS.keys()), default="1d")]
+):
+    await ctx.defer()
+    ex = await exchanges.get(ctx.guild_id)
+    ticker = ticker.upper()
+    candles = await ex.db.read(load_candles, ticker, interval)
+    if not candles:
+        await ctx.followup.send(f"No trades have been recorded for `{ticker}` yet.", ephemeral=True)
+        return
+    await ctx.followup.send(embed=render_chart(ticker, interval, candles))
 
 
+def cancel_open_order(conn, ex, user_id, order_id):
+    order = conn.execute("SELECT * FROM orders WHERE order_id = ? AND user_id = ? AND status = 'OPEN'", (order_id, user_id)).fetchone()
+    if not order:
+        raise CommandError("Could not find an open order with that ID belonging to you.")
+    if order['order_type'] == 'SELL':
+        conn.execute("UPDATE holdings SET amount = amount + ? WHERE user_id = ? AND ticker = ?", (order['amount'], user_id, order['ticker']))
+    else:
+        escrowed = order['amount'] * order['price_per_token']
+        conn.execute("UPDATE users SET kcred_balance = kcred_balance + ?, reserved = MAX(reserved - ?, 0) WHERE user_id = ?", (escrowed, escrowed, user_id))
+    conn.execute("UPDATE orders SET status = 'CANCELLED' WHERE order_id = ?", (order_id,))
+    journal.record(conn, 'CANCEL', user_id=user_id, ticker=order['ticker'], order_id=order_id)
+    conn.commit()
+    ex.books.remove(order['ticker'], order_id)
+    ex.portfolios.invalidate([user_id])
+    return order
+
 @bot.slash_command(name="cancel_order", description="Cancel one of your open buy or sell orders.")
 async def cancel_order(ctx, order_id: Annotated[int, discord.Option(int, description="The ID of the order you wish to cancel (from /profile)")]):
-    await ctx.defer(ephemeral=True) 
+    await ctx.defer(ephemeral=True)
+    ex = await exchanges.get(ctx.guild_id)
     user_id = ctx.author.id
-    conn = sqlite3.connect('economy.db'); conn.row_factory = sqlite3.Row; cursor = conn.cursor()
-    cursor.execute("SELECT * FROM orders WHERE order_id = ? AND user_id = ? AND status = 'OPEN'", (order_id, user_id))
-    order = cursor.fetchone()
-    if not order:
-        await ctx.followup.send("Could not find an open order with that ID belonging to you.")
-        conn.close()
+    try:
+        order = await ex.db.write(cancel_open_order, ex, user_id, order_id)
+    except CommandError as e:
+        await ctx.followup.send(str(e))
         return
-    if order['order_type'] == 'SELL':
-        cursor.execute("UPDATE holdings SET amount = amount + ? WHERE user_id = ? AND ticker = ?", (order['amount'], user_id, order['ticker']))
-    cursor.execute("UPDATE orders SET status = 'CANCELLED' WHERE order_id = ?", (order_id,))
-    conn.commit()
-    conn.close()
     await ctx.followup.send(f"Successfully cancelled order `{order_id}` ({order['order_type']} {order['amount']} {order['ticker']}).")
 
 
-async def match_orders(bot: discord.Bot, ticker: str):
-    print(f"Running full order matching engine for {ticker}...")
-    conn = sqlite3.connect('economy.db')
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+def execute_matches(conn, ex, ticker):
+    status = conn.execute("SELECT status FROM goals WHERE ticker = ?", (ticker,)).fetchone()
+    if not status or status[0] != 'ACTIVE':
+        return []  # Trading has halted (expired or settling); settlement cancels what is left
+    book = ex.books.get(ticker)
+    iterations = book.iterations
+    if ticker in ex.matcher.intervals:
+        fills = book.uncross(reference=ex.rankings.prices.get(ticker))
+    else:
+        fills = book.match()
+    stats.count('matching_iterations', book.iterations - iterations)
+    if not fills:
+        return fills
+
+    # Collapse the batch into one statement per touched user, holding and order.
+    # Buyers pay from escrow at their limit price and get any price improvement back.
+    balance_deltas, reserved_deltas, holding_deltas, order_fills = {}, {}, {}, {}
+    for fill in fills:
+        total_value = fill.amount * fill.price
+        commission = total_value * TRADING_FEE_PCT
+        escrowed = fill.amount * fill.buy_limit
+        reserved_deltas[fill.buyer_id] = reserved_deltas.get(fill.buyer_id, 0) + escrowed
+        balance_deltas[fill.buyer_id] = balance_deltas.get(fill.buyer_id, 0) + escrowed - total_value
+        balance_deltas[fill.seller_id] = balance_deltas.get(fill.seller_id, 0) + total_value - commission
+        holding_deltas[fill.buyer_id] = holding_deltas.get(fill.buyer_id, 0) + fill.amount
+        order_fills[fill.buy_order_id] = order_fills.get(fill.buy_order_id, 0) + fill.amount
+        order_fills[fill.sell_order_id] = order_fills.get(fill.sell_order_id, 0) + fill.amount
 
-    while True:
-        cursor.execute("SELECT * FROM orders WHERE ticker = ? AND order_type = 'SELL' AND status = 'OPEN' AND amount > 0 ORDER BY price_per_token ASC, order_id ASC LIMIT 1", (ticker,))
-        sell_order = cursor.fetchone()
-        cursor.execute("SELECT * FROM orders WHERE ticker = ? AND order_type = 'BUY' AND status = 'OPEN' AND amount > 0 ORDER BY price_per_token DESC, order_id ASC LIMIT 1", (ticker,))
-        buy_order = cursor.fetchone()
+    try:
+        conn.executemany("UPDATE users SET kcred_balance = kcred_balance + ?, reserved = MAX(reserved - ?, 0) WHERE user_id = ?",
+                         [(delta, reserved_deltas.get(user_id, 0), user_id) for user_id, delta in balance_deltas.items()])
+        conn.executemany(HOLDING_UPSERT, [(user_id, ticker, amount) for user_id, amount in holding_deltas.items()])
+        conn.executemany("UPDATE orders SET amount = amount - ?1, status = CASE WHEN amount - ?1 <= 0 THEN 'CLOSED' ELSE status END WHERE order_id = ?2",
+                         [(amount, order_id) for order_id, amount in order_fills.items()])
+        record_fills(conn, fills)
+        journal.record_fills(conn, fills)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        ex.books.load(conn, ticker)
+        raise
+    ex.rankings.mark(ticker, fills[-1].price)
+    ex.rankings.refresh(conn, balance_deltas)
+    ex.portfolios.invalidate(balance_deltas)
+    return fills
 
-        if not sell_order or not buy_order or buy_order['price_per_token'] < sell_order['price_per_token']:
-            break
 
-        trade_price = sell_order['price_per_token'] if sell_order['order_id'] < buy_order['order_id'] else buy_order['price_per_token']
-        trade_amount = min(buy_order['amount'], sell_order['amount'])
-        total_value = trade_amount * trade_price
-        commission = total_value * TRADING_FEE_PCT
-        buyer_id = buy_order['user_id']
-        seller_id = sell_order['user_id']
-        
-        buyer_balance = get_user_balance(buyer_id)
-        if buyer_balance < total_value:
-            cursor.execute("UPDATE orders SET status = 'CANCELLED' WHERE order_id = ?", (buy_order['order_id'],))
-            conn.commit()
-            print(f"Cancelled buy order {buy_order['order_id']} due to insufficient funds.")
-            continue
+async def match_orders(ex, ticker: str):
+    with stats.scope('matching'):
+        await run_matching_pass(ex, ticker)
 
-        try:
-            conn.execute("UPDATE users SET kcred_balance = kcred_balance - ? WHERE user_id = ?", (total_value, buyer_id))
-            conn.execute("UPDATE users SET kcred_balance = kcred_balance + ? WHERE user_id = ?", (total_value - commission, seller_id))
-
-            cursor.execute("SELECT holding_id FROM holdings WHERE user_id = ? AND ticker = ?", (buyer_id, ticker))
-            buyer_holding = cursor.fetchone()
-            if buyer_holding:
-                cursor.execute("UPDATE holdings SET amount = amount + ? WHERE holding_id = ?", (trade_amount, buyer_holding['holding_id']))
-            else:
-                cursor.execute("INSERT INTO holdings (user_id, ticker, amount) VALUES (?, ?, ?)", (buyer_id, ticker, trade_amount))
-            
-            cursor.execute("UPDATE orders SET amount = amount - ? WHERE order_id = ?", (trade_amount, buy_order['order_id']))
-            cursor.execute("UPDATE orders SET amount = amount - ? WHERE order_id = ?", (trade_amount, sell_order['order_id']))
-            cursor.execute("UPDATE orders SET status = 'CLOSED' WHERE amount <= 0")
-            conn.commit()
-
-            print(f"Trade executed: {trade_amount} of {ticker} at {trade_price} each.")
-            channel = bot.get_channel(TRADING_CHANNEL_ID)
-            if channel:
-                buyer = await bot.fetch_user(buyer_id)
-                seller = await bot.fetch_user(seller_id)
-                embed = discord.Embed(title="📈 Trade Executed!", description=f"**{trade_amount}** shares of `{ticker}` traded.", color=discord.Color.magenta())
-                embed.add_field(name="Price", value=f"✨ {trade_price:,.2f} / token", inline=False)
-                embed.add_field(name="Total Value", value=f"✨ {total_value:,.2f}", inline=False)
-                embed.set_footer(text=f"Buyer: {buyer.name} | Seller: {seller.name}")
-                await channel.send(embed=embed)
-
-        except Exception as e:
-            conn.rollback()
-            print(f"An error occurred during trade execution, transaction rolled back. Error: {e}")
-            break
-
-    conn.close()
+
+async def run_matching_pass(ex, ticker: str):
+    try:
+        fills = await ex.db.write(execute_matches, ex, ticker)
+    except Exception as e:
+        print(f"An error occurred during trade execution, transaction rolled back. Error: {e}")
+        return
+    stats.count('matching_passes')
+    stats.count('fills', len(fills))
+    if fills:
+        ex.tickers.record_volume(ticker, sum(fill.amount for fill in fills))
+    ex.publisher.publish(fills)
+
+
+# --- Call Auctions ---
+def set_auction_interval(conn, ticker, seconds):
+    if not conn.execute("UPDATE goals SET auction_interval = ? WHERE ticker = ? AND status IN ('ICO', 'ACTIVE')", (seconds or None, ticker)).rowcount:
+        raise CommandError(f"No tradeable goal found with ticker `{ticker}`.")
+    journal.record(conn, 'AUCTION', ticker=ticker, amount=seconds or None)
+
+@bot.slash_command(name="auction", description="[Admin] Switch a token between continuous matching and periodic call auctions.", default_member_permissions=discord.Permissions(administrator=True))
+async def auction(ctx,
+    ticker: Annotated[str, discord.Option(str, description="The ticker to switch", autocomplete=ticker_autocomplete('ICO', 'ACTIVE'))],
+    seconds: Annotated[int, discord.Option(int, description="Seconds between auctions, or 0 for continuous matching", min_value=0)]
+):
+    await ctx.defer(ephemeral=True)
+    ex = await exchanges.get(ctx.guild_id)
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.followup.send("Only administrators can change how a token is matched.")
+        return
+    ticker = ticker.upper()
+    try:
+        await ex.db.write(set_auction_interval, ticker, seconds)
+    except CommandError as e:
+        await ctx.followup.send(str(e))
+        return
+    ex.matcher.set_interval(ticker, seconds)
+    # Uncross whatever is resting now under the new mode
+    ex.matcher.trigger(ticker)
+    if seconds:
+        await ctx.followup.send(f"`{ticker}` now matches in a call auction every **{seconds}s**, all at a single clearing price.")
+    else:
+        await ctx.followup.send(f"`{ticker}` is back on continuous matching.")
+
+
+# --- Leaderboard ---
+LEADERBOARD_SIZE = 10
+
+@bot.slash_command(name="leaderboard", description="See the richest traders by net worth.")
+async def leaderboard(ctx):
+    await ctx.defer()
+    ex = await exchanges.get(ctx.guild_id)
+    top = ex.rankings.top(LEADERBOARD_SIZE)
+    if not top:
+        await ctx.followup.send("Nobody has any Auras yet. Claim your `/weekly` allowance to get started!")
+        return
+    member_names = await names.resolve_many([user_id for user_id, _ in top])
+    medals = {1: "🥇", 2: "🥈", 3: "🥉"}
+    lines = [f"{medals.get(i, f'**{i}.**')} {member_names[user_id]}: ✨ {worth:,.2f}" for i, (user_id, worth) in enumerate(top, start=1)]
+    embed = discord.Embed(title="🏆 Richest Traders", description="\n".join(lines), color=discord.Color.gold())
+    own = ex.rankings.rank(ctx.author.id)
+    if own:
+        embed.set_footer(text=f"Your rank: #{own[0]:,} of {len(ex.rankings):,} with ✨ {own[1]:,.2f}. Net worth marks tokens to their last trade or ICO price.")
+    await ctx.followup.send(embed=embed)
+
+
+# --- Goal Deadlines ---
+def mark_expired(conn, tickers, now):
+    placeholders = ", ".join("?" * len(tickers))
+    expired = [row[0] for row in conn.execute(
+        f"SELECT ticker FROM goals WHERE ticker IN ({placeholders}) AND status IN ('ICO', 'ACTIVE') AND current_deadline <= ?", (*tickers, now)
+    )]
+    conn.executemany("UPDATE goals SET status = 'EXPIRED' WHERE ticker = ?", [(ticker,) for ticker in expired])
+    for ticker in expired:
+        journal.record(conn, 'EXPIRE', ticker=ticker)
+    return expired
+
+async def expire_goals(ex, tickers):
+    with stats.scope('deadlines'):
+        expired = await ex.db.write(mark_expired, tickers, datetime.utcnow().isoformat())
+    if expired:
+        ex.market.bump()
+        for ticker in expired:
+            ex.tickers.set_status(ticker, 'EXPIRED')
+        print(f"[{ex.guild_id}] Expired {len(expired)} goal(s): {', '.join(expired)}")
+
+
+# --- Goal Settlement ---
+def settle_ticker(conn, ex, ticker):
+    report = run_settlement(conn, ticker)
+    conn.commit()
+    ex.books.drop(ticker)
+    ex.rankings.drop(ticker)
+    ex.portfolios.clear()
+    return report
+
+@bot.slash_command(name="resolve", description="[Admin] Settle a goal, converting every holding into a Trophy or Relic.", default_member_permissions=discord.Permissions(administrator=True))
+async def resolve(ctx,
+    ticker: Annotated[str, discord.Option(str, description="The ticker of the goal to settle", autocomplete=ticker_autocomplete('ICO', 'ACTIVE', 'EXPIRED', 'SETTLING'))],
+    outcome: Annotated[str, discord.Option(str, description="Was the goal achieved?", choices=list(OUTCOMES.keys()))]
+):
+    await ctx.defer(ephemeral=True)
+    ex = await exchanges.get(ctx.guild_id)
+    if not ctx.author.guild_permissions.administrator:
+        await ctx.followup.send("Only administrators can resolve goals.")
+        return
+    ticker = ticker.upper()
+    try:
+        await ex.db.write(begin_settlement, ticker, outcome)
+    except SettlementError as e:
+        await ctx.followup.send(str(e))
+        return
+    ex.deadlines.discard(ticker)
+    ex.market.bump()
+    ex.tickers.set_status(ticker, 'SETTLING')
+    report = await ex.db.write(settle_ticker, ex, ticker)
+    ex.matcher.set_interval(ticker, None)
+    ex.tickers.set_status(ticker, OUTCOMES[outcome][1])
+    asset = ASSET_NAMES[OUTCOMES[outcome][0]]
+    await ctx.followup.send(
+        f"Settled `{ticker}` as **{outcome}**: {report['holders']} holding(s) converted to {asset}, "
+        f"{report['orders_cancelled']} open order(s) cancelled and {report['tokens_refunded']} listed token(s) returned."
+    )
+
+
+# --- Per-Guild Exchanges ---
+exchanges = ExchangeRegistry(config, bot, stats, names, match_orders, expire_goals)
 
 
 # --- Run the Bot ---
-bot.run(TOKEN)
+if __name__ == '__main__':
+    bot.run(TOKEN)
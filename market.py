@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime
+import discord
+
+# --- Market Snapshot ---
+# /market lists goals from one query (SQL is only needed for ICO supply) and
+# caches the rows until a mint, ICO buy, listing or status change bumps the
+# market version. Concurrent misses share a single in-flight load. Best bid and
+# ask come straight from the in-memory books at render time, so orders, fills
+# and cancels never invalidate anything; each rendered page is reused until one
+# of its quotes actually moves. Pages stay well under Discord's 25-field embed limit.
+
+GOALS_PER_PAGE = 10
+
+MARKET_QUERY = """
+    SELECT g.ticker, g.founder_id, g.scenario, g.target_score, g.status, g.ico_price, g.current_deadline,
+           COALESCE(h.tokens_sold, 0) AS tokens_sold
+    FROM goals g
+    LEFT JOIN (
+        SELECT ticker, SUM(amount) AS tokens_sold FROM holdings
+        WHERE ticker IN (SELECT ticker FROM goals WHERE status = 'ICO')
+        GROUP BY ticker
+    ) h ON h.ticker = g.ticker
+    WHERE g.status IN ('ICO', 'ACTIVE')
+    ORDER BY g.ticker
+"""
+
+
+def render_listing(goal, founder_name, lowest_ask, highest_bid):
+    status = goal['status']
+    if status == 'ICO':
+        info_text = (
+            f"**Price:** ✨ {goal['ico_price']:,.2f} / token\n"
+            f"**Available:** {100 - goal['tokens_sold']} tokens remaining"
+        )
+    else:
+        ask_text = f"✨ {lowest_ask:,.2f}" if lowest_ask else "N/A"
+        bid_text = f"✨ {highest_bid:,.2f}" if highest_bid else "N/A"
+        info_text = f"**Lowest Ask:** {ask_text}\n**Highest Bid:** {bid_text}"
+    name = f"`{goal['ticker']}` ({status}) - Founded by {founder_name}"
+    value = (
+        f"**Goal:** {goal['target_score']} in *{goal['scenario']}*\n"
+        f"{info_text}\n"
+        f"**Closes:** <t:{int(datetime.fromisoformat(goal['current_deadline']).timestamp())}:R>"
+    )
+    return name, value
+
+
+class MarketSnapshot:
+    def __init__(self, db, names, books):
+        self.db = db
+        self.names = names
+        self.books = books
+        self.version = 0
+        self._listings = None
+        self._loading = None
+        self._rendered = {}
+
+    def bump(self):
+        self.version += 1
+
+    def _quote(self, ticker):
+        book = self.books.books.get(ticker)
+        if book is None:
+            return None, None
+        return book.top('SELL'), book.top('BUY')
+
+    async def _fetch(self, version):
+        goals = await self.db.fetchall(MARKET_QUERY)
+        founder_names = await self.names.resolve_many([goal['founder_id'] for goal in goals])
+        # A bump during the load means this result may already be stale; serve it but don't cache it.
+        if version == self.version:
+            self._listings = (version, goals, founder_names)
+        return version, goals, founder_names
+
+    async def _load(self):
+        if self._listings is not None and self._listings[0] == self.version:
+            return self._listings
+        loading = self._loading
+        if loading is None or loading[0] != self.version:
+            loading = self._loading = (self.version, asyncio.ensure_future(self._fetch(self.version)))
+        try:
+            return await asyncio.shield(loading[1])
+        finally:
+            if loading[1].done() and self._loading is loading:
+                self._loading = None
+
+    async def pages(self):
+        """Rendered /market embeds with live quotes, or [] if the market is empty."""
+        version, goals, founder_names = await self._load()
+        quotes = tuple(self._quote(goal['ticker']) if goal['status'] == 'ACTIVE' else (None, None) for goal in goals)
+
+        pages = []
+        page_count = (len(goals) + GOALS_PER_PAGE - 1) // GOALS_PER_PAGE
+        for start in range(0, len(goals), GOALS_PER_PAGE):
+            page_quotes = quotes[start:start + GOALS_PER_PAGE]
+            key = (version, page_count, page_quotes)
+            cached = self._rendered.get(start)
+            if cached is not None and cached[0] == key:
+                pages.append(cached[1])
+                continue
+            embed = discord.Embed(title="📈 TSK Score Exchange Market", color=discord.Color.gold())
+            for goal, (lowest_ask, highest_bid) in zip(goals[start:start + GOALS_PER_PAGE], page_quotes):
+                name, value = render_listing(goal, founder_names[goal['founder_id']], lowest_ask, highest_bid)
+                embed.add_field(name=name, value=value, inline=False)
+            footer = "Use /view <ticker> for more details or /orderbook <ticker> to see all orders."
+            if page_count > 1:
+                footer = f"Page {len(pages) + 1}/{page_count} • {footer}"
+            embed.set_footer(text=footer)
+            self._rendered[start] = (key, embed)
+            pages.append(embed)
+        return pages
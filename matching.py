@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+# --- Per-Ticker Matching Scheduler ---
+# At most one matching pass runs per ticker at a time; different tickers run
+# independently. Triggers that arrive while a pass is queued or running only
+# mark the ticker dirty, so a burst of orders collapses into one extra pass.
+# Tickers in call-auction mode wait for the next multiple of their interval
+# instead, so they get at most one pass per interval however busy they are.
+# Changing a ticker's interval wakes its waiting worker to reschedule.
+
+
+class MatchScheduler:
+    def __init__(self, run_pass, coalesce_delay=0.05):
+        self._run_pass = run_pass
+        self.coalesce_delay = coalesce_delay
+        self._dirty = set()
+        self._workers = {}
+        self._wakeups = {}
+        self.intervals = {}
+
+    def set_interval(self, ticker, seconds):
+        """Run ticker as a call auction every `seconds`, or continuously if falsy.
+        Call it on the event loop: a worker already waiting is woken to recompute its delay."""
+        if seconds:
+            self.intervals[ticker] = seconds
+        else:
+            self.intervals.pop(ticker, None)
+        wakeup = self._wakeups.get(ticker)
+        if wakeup is not None:
+            wakeup.set()
+
+    def busy(self):
+        """Whether any pass is queued, waiting for its auction or running."""
+        return bool(self._workers)
+
+    def _delay(self, ticker):
+        interval = self.intervals.get(ticker)
+        if interval is None:
+            return self.coalesce_delay
+        return interval - time.time() % interval
+
+    def trigger(self, ticker):
+        self._dirty.add(ticker)
+        if ticker not in self._workers:
+            self._workers[ticker] = asyncio.create_task(self._worker(ticker))
+
+    async def _worker(self, ticker):
+        try:
+            while ticker in self._dirty:
+                await self._sleep(ticker)
+                self._dirty.discard(ticker)
+                try:
+                    await self._run_pass(ticker)
+                except Exception as e:
+                    print(f"Matching pass for {ticker} failed: {e}")
+        finally:
+            del self._workers[ticker]
+            self._wakeups.pop(ticker, None)
+
+    async def _sleep(self, ticker):
+        while True:
+            wakeup = self._wakeups[ticker] = asyncio.Event()
+            try:
+                await asyncio.wait_for(wakeup.wait(), self._delay(ticker))
+            except asyncio.TimeoutError:
+                return
+
+    async def join(self):
+        """Wait until every queued and running pass has finished."""
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
@@ -0,0 +1,101 @@
+import sqlite3
+
+# --- Schema Migrations ---
+# Each migration runs once, in order, inside its own transaction. The schema
+# version lives in PRAGMA user_version, so re-running migrate() is a no-op.
+
+
+def _base_schema(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS users (user_id INTEGER PRIMARY KEY, kcred_balance REAL DEFAULT 0, last_weekly_claim TEXT)")
+    conn.execute("CREATE TABLE IF NOT EXISTS goals (ticker TEXT PRIMARY KEY, founder_id INTEGER, scenario TEXT, target_score TEXT, tier TEXT, ico_price REAL, status TEXT, initial_deadline TEXT, current_deadline TEXT, extension_round INTEGER DEFAULT 0, FOREIGN KEY (founder_id) REFERENCES users (user_id))")
+    conn.execute("CREATE TABLE IF NOT EXISTS holdings (holding_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, ticker TEXT, amount INTEGER, asset_type TEXT DEFAULT 'TOKEN', FOREIGN KEY (user_id) REFERENCES users (user_id), FOREIGN KEY (ticker) REFERENCES goals (ticker))")
+    conn.execute("CREATE TABLE IF NOT EXISTS orders (order_id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, ticker TEXT, order_type TEXT, amount INTEGER, price_per_token REAL, status TEXT DEFAULT 'OPEN', FOREIGN KEY (user_id) REFERENCES users (user_id), FOREIGN KEY (ticker) REFERENCES goals (ticker))")
+
+
+def _hot_path_indexes(conn):
+    # Older databases may hold several rows per (user, ticker); fold them into the
+    # oldest row before the unique key goes on.
+    conn.execute("""
+        UPDATE holdings SET amount = (SELECT SUM(h.amount) FROM holdings h WHERE h.user_id = holdings.user_id AND h.ticker = holdings.ticker)
+        WHERE holding_id IN (SELECT MIN(holding_id) FROM holdings GROUP BY user_id, ticker HAVING COUNT(*) > 1)
+    """)
+    conn.execute("DELETE FROM holdings WHERE holding_id NOT IN (SELECT MIN(holding_id) FROM holdings GROUP BY user_id, ticker)")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_holdings_user_ticker ON holdings (user_id, ticker)")
+    # ICO supply: SUM(amount) WHERE ticker = ?
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_holdings_ticker_amount ON holdings (ticker, amount)")
+    # Best bid/ask, /orderbook depth and book rebuilds only ever look at open orders.
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_orders_open_book ON orders (ticker, order_type, price_per_token, amount) WHERE status = 'OPEN'")
+    # /profile open orders
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_orders_open_user ON orders (user_id) WHERE status = 'OPEN'")
+    # /market listing
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_goals_status ON goals (status)")
+
+
+def _trade_ledger(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS trades (trade_id INTEGER PRIMARY KEY AUTOINCREMENT, ticker TEXT, buy_order_id INTEGER, sell_order_id INTEGER, buyer_id INTEGER, seller_id INTEGER, amount INTEGER, price REAL, executed_at TEXT, FOREIGN KEY (ticker) REFERENCES goals (ticker))")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_trades_ticker ON trades (ticker, trade_id)")
+    # OHLCV rollups, keyed for range scans on (ticker, interval, time)
+    conn.execute("CREATE TABLE IF NOT EXISTS candles (ticker TEXT, interval TEXT, bucket_start INTEGER, open REAL, high REAL, low REAL, close REAL, volume INTEGER, trade_count INTEGER, PRIMARY KEY (ticker, interval, bucket_start)) WITHOUT ROWID")
+
+
+def _settlements(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS settlements (ticker TEXT PRIMARY KEY, outcome TEXT, status TEXT, holders INTEGER, orders_cancelled INTEGER, tokens_refunded INTEGER, started_at TEXT, finished_at TEXT, FOREIGN KEY (ticker) REFERENCES goals (ticker))")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_settlements_pending ON settlements (ticker) WHERE status = 'PENDING'")
+
+
+def _buyer_escrow(conn):
+    # Buy orders now lock their maximum cost up front. Reserve funds for the open
+    # ones oldest first and cancel any the owner can no longer cover.
+    conn.execute("ALTER TABLE users ADD COLUMN reserved REAL DEFAULT 0")
+    balances = dict(conn.execute("SELECT user_id, kcred_balance FROM users").fetchall())
+    reserved, cancelled = {}, []
+    for order_id, user_id, cost in conn.execute("SELECT order_id, user_id, amount * price_per_token FROM orders WHERE order_type = 'BUY' AND status = 'OPEN' AND amount > 0 ORDER BY order_id").fetchall():
+        if balances.get(user_id, 0) >= cost:
+            balances[user_id] -= cost
+            reserved[user_id] = reserved.get(user_id, 0) + cost
+        else:
+            cancelled.append((order_id,))
+    conn.executemany("UPDATE users SET kcred_balance = kcred_balance - ?1, reserved = ?1 WHERE user_id = ?2", [(cost, user_id) for user_id, cost in reserved.items()])
+    conn.executemany("UPDATE orders SET status = 'CANCELLED' WHERE order_id = ?", cancelled)
+
+
+def _call_auctions(conn):
+    # Seconds between call auctions; NULL keeps the ticker on continuous matching.
+    conn.execute("ALTER TABLE goals ADD COLUMN auction_interval INTEGER")
+
+
+def _event_journal(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS events (seq INTEGER PRIMARY KEY, at REAL, kind TEXT, user_id INTEGER, ticker TEXT, order_id INTEGER, amount, price REAL, ref INTEGER, data TEXT)")
+
+
+MIGRATIONS = [
+    _base_schema,
+    _hot_path_indexes,
+    _trade_ledger,
+    _settlements,
+    _buyer_escrow,
+    _call_auctions,
+    _event_journal,
+]
+
+
+def migrate(path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS, start=1):
+            if number <= version:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            print(f"Applied migration {number}: {migration.__name__.strip('_')}")
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
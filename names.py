@@ -0,0 +1,65 @@
+import asyncio
+import time
+from collections import OrderedDict
+import discord
+
+# --- Display Name Resolution ---
+# Lookup order: the gateway user cache (filled by the members intent), then a
+# bounded LRU of names fetched earlier, and only then REST. Misses from a single
+# render are fetched concurrently rather than one after another.
+
+UNKNOWN_NAME = "Unknown User"
+
+
+class NameResolver:
+    def __init__(self, bot, maxsize=4096, ttl=3600, concurrency=8):
+        self.bot = bot
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._cache = OrderedDict()
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    def cached(self, user_id):
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            return user.name
+        entry = self._cache.get(user_id)
+        if entry is None:
+            return None
+        name, expires = entry
+        if expires < time.monotonic():
+            del self._cache[user_id]
+            return None
+        self._cache.move_to_end(user_id)
+        return name
+
+    def _remember(self, user_id, name):
+        self._cache[user_id] = (name, time.monotonic() + self.ttl)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    async def _fetch(self, user_id):
+        async with self._semaphore:
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except discord.HTTPException:
+                return UNKNOWN_NAME
+        self._remember(user_id, user.name)
+        return user.name
+
+    async def resolve(self, user_id):
+        return (await self.resolve_many([user_id]))[user_id]
+
+    async def resolve_many(self, user_ids):
+        names, missing = {}, []
+        for user_id in set(user_ids):
+            name = self.cached(user_id)
+            if name is None:
+                missing.append(user_id)
+            else:
+                names[user_id] = name
+        if missing:
+            fetched = await asyncio.gather(*(self._fetch(user_id) for user_id in missing))
+            names.update(zip(missing, fetched))
+        return names
@@ -0,0 +1,195 @@
+import heapq
+import itertools
+from collections import deque, namedtuple
+from itertools import accumulate
+
+# --- In-Memory Order Book ---
+# One book per ticker. Each side keeps a dict of price -> FIFO queue of resting
+# orders plus a heap of prices for O(log n) best-price lookup. Empty levels are
+# dropped from the dict and their heap entries are skipped lazily. Aggregate
+# size per level is kept alongside, and every change takes a new version number
+# (unique across books, so a rebuilt book never reuses one). `iterations`
+# counts matching-loop steps plus stale heap entries popped along the way.
+
+# Charged to the seller on every fill; replay.py applies the same rule offline.
+TRADING_FEE_PCT = 0.01
+
+_versions = itertools.count(1)
+
+Fill = namedtuple("Fill", "ticker buy_order_id sell_order_id buyer_id seller_id amount price buy_limit")
+
+
+class Order:
+    __slots__ = ("order_id", "user_id", "ticker", "side", "amount", "price")
+
+    def __init__(self, order_id, user_id, ticker, side, amount, price):
+        self.order_id = order_id
+        self.user_id = user_id
+        self.ticker = ticker
+        self.side = side
+        self.amount = amount
+        self.price = price
+
+
+class OrderBook:
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.orders = {}
+        self._levels = {'BUY': {}, 'SELL': {}}
+        self._heaps = {'BUY': [], 'SELL': []}
+        self._depth = {'BUY': {}, 'SELL': {}}
+        self.version = next(_versions)
+        self.iterations = 0
+
+    def add(self, order: Order):
+        levels = self._levels[order.side]
+        queue = levels.get(order.price)
+        if queue is None:
+            queue = levels[order.price] = deque()
+            heapq.heappush(self._heaps[order.side], -order.price if order.side == 'BUY' else order.price)
+        queue.append(order)
+        self.orders[order.order_id] = order
+        depth = self._depth[order.side]
+        depth[order.price] = depth.get(order.price, 0) + order.amount
+        self.version = next(_versions)
+
+    def remove(self, order_id):
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return None
+        levels = self._levels[order.side]
+        queue = levels[order.price]
+        queue.remove(order)
+        if not queue:
+            del levels[order.price]
+            del self._depth[order.side][order.price]
+        else:
+            self._depth[order.side][order.price] -= order.amount
+        self.version = next(_versions)
+        return order
+
+    def best(self, side):
+        heap, levels = self._heaps[side], self._levels[side]
+        while heap:
+            price = -heap[0] if side == 'BUY' else heap[0]
+            if price in levels:
+                return levels[price][0]
+            heapq.heappop(heap)
+            self.iterations += 1
+        return None
+
+    def _consume(self, order: Order, amount):
+        order.amount -= amount
+        self._depth[order.side][order.price] -= amount
+        if order.amount <= 0:
+            self.remove(order.order_id)
+        else:
+            self.version = next(_versions)
+
+    def depth(self, side, n):
+        """Best n (price, size) levels for a side. Safe to call off the writer thread:
+        copying a dict is atomic under the GIL."""
+        levels = dict(self._depth[side])
+        pick = heapq.nlargest if side == 'BUY' else heapq.nsmallest
+        return [(price, levels[price]) for price in pick(n, levels)], len(levels)
+
+    def top(self, side):
+        """Best price on a side, or None. Unlike best() it never pops stale heap
+        entries, so it is safe off the writer thread."""
+        heap = self._heaps[side]
+        try:
+            price = -heap[0] if side == 'BUY' else heap[0]
+        except IndexError:
+            return None
+        if price in self._depth[side]:
+            return price
+        levels, _ = self.depth(side, 1)
+        return levels[0][0] if levels else None
+
+    def match(self):
+        """Cross the book until bids and asks no longer overlap.
+
+        Buy orders are fully escrowed when placed, so every crossing pair fills.
+        """
+        fills = []
+        while True:
+            self.iterations += 1
+            buy, sell = self.best('BUY'), self.best('SELL')
+            if buy is None or sell is None or buy.price < sell.price:
+                break
+            price = sell.price if sell.order_id < buy.order_id else buy.price
+            amount = min(buy.amount, sell.amount)
+            fills.append(Fill(self.ticker, buy.order_id, sell.order_id, buy.user_id, sell.user_id, amount, price, buy.price))
+            self._consume(buy, amount)
+            self._consume(sell, amount)
+        return fills
+
+    def clearing_price(self, reference=None):
+        """Single price that maximises matched volume, as (price, volume).
+
+        Ties go to the smallest surplus on either side, then to the price nearest
+        the reference (usually the last trade).
+        """
+        bids, asks = self._depth['BUY'], self._depth['SELL']
+        if not bids or not asks:
+            return None, 0
+        low, high = min(asks), max(bids)
+        if high < low:
+            return None, 0
+        # Every level price between the lowest ask and the highest bid is a candidate.
+        # Cumulative asks from below and bids from above give supply and demand at each.
+        candidates = sorted(price for price in bids.keys() | asks.keys() if low <= price <= high)
+        supply = list(accumulate(asks.get(price, 0) for price in candidates))
+        demand = list(accumulate(bids.get(price, 0) for price in reversed(candidates)))[::-1]
+        best = max(
+            range(len(candidates)),
+            key=lambda i: (min(supply[i], demand[i]), -abs(supply[i] - demand[i]), -abs(candidates[i] - reference) if reference is not None else 0)
+        )
+        return candidates[best], min(supply[best], demand[best])
+
+    def uncross(self, reference=None):
+        """Call-auction match: every fill executes at one clearing price."""
+        price, volume = self.clearing_price(reference)
+        fills = []
+        while volume > 0:
+            self.iterations += 1
+            buy, sell = self.best('BUY'), self.best('SELL')
+            amount = min(buy.amount, sell.amount, volume)
+            fills.append(Fill(self.ticker, buy.order_id, sell.order_id, buy.user_id, sell.user_id, amount, price, buy.price))
+            self._consume(buy, amount)
+            self._consume(sell, amount)
+            volume -= amount
+        return fills
+
+
+class OrderBookManager:
+    def __init__(self):
+        self.books = {}
+
+    def get(self, ticker) -> OrderBook:
+        book = self.books.get(ticker)
+        if book is None:
+            book = self.books[ticker] = OrderBook(ticker)
+        return book
+
+    def add(self, order: Order):
+        self.get(order.ticker).add(order)
+
+    def remove(self, ticker, order_id):
+        return self.get(ticker).remove(order_id)
+
+    def drop(self, ticker):
+        self.books.pop(ticker, None)
+
+    def load(self, conn, ticker=None):
+        """(Re)build books from the orders table, for every ticker or just one."""
+        query = "SELECT order_id, user_id, ticker, order_type, amount, price_per_token FROM orders WHERE status = 'OPEN' AND amount > 0"
+        params = ()
+        if ticker is None:
+            self.books = {}
+        else:
+            self.books.pop(ticker, None)
+            query += " AND ticker = ?"
+            params = (ticker,)
+        for row in conn.execute(query + " ORDER BY order_id ASC", params):
+            self.add(Order(*row))
@@ -0,0 +1,141 @@
+import asyncio
+import time
+import discord
+from settlement import ASSET_NAMES
+
+# --- Portfolio View ---
+# /profile reads a user's balance, escrow, positions and open orders in one
+# read transaction, without creating a users row for someone who has never
+# traded. The rows are cached per user until a command touching that user's
+# balance, holdings or orders invalidates them (and for PORTFOLIO_TTL at most).
+# Positions are valued at render time from the leaderboard's marks, so other
+# people's trades never need to evict anything. Field values are split by line
+# count and by Discord's 1024 character limit, since tickers can be long.
+
+PORTFOLIO_TTL = 60
+POSITIONS_PER_PAGE = 10
+ORDERS_PER_PAGE = 10
+FIELD_LIMIT = 1024
+
+POSITIONS_QUERY = """
+    SELECT ticker, SUM(held) AS held, SUM(listed) AS listed FROM (
+        SELECT ticker, amount AS held, 0 AS listed FROM holdings WHERE user_id = ?1 AND asset_type = 'TOKEN' AND amount > 0
+        UNION ALL
+        SELECT ticker, 0, amount FROM orders WHERE user_id = ?1 AND order_type = 'SELL' AND status = 'OPEN' AND amount > 0
+    ) GROUP BY ticker ORDER BY ticker
+"""
+
+
+def load_portfolio(conn, user_id):
+    conn.execute("BEGIN")
+    try:
+        user = conn.execute("SELECT kcred_balance, reserved FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        positions = conn.execute(POSITIONS_QUERY, (user_id,)).fetchall()
+        orders = conn.execute("SELECT order_id, ticker, order_type, amount, price_per_token FROM orders WHERE user_id = ? AND status = 'OPEN' ORDER BY order_id", (user_id,)).fetchall()
+        trophies = conn.execute("SELECT ticker, amount, asset_type FROM holdings WHERE user_id = ? AND asset_type != 'TOKEN' AND amount > 0 ORDER BY ticker", (user_id,)).fetchall()
+    finally:
+        conn.rollback()
+    balance, reserved = (user[0] or 0, user[1] or 0) if user else (0, 0)
+    return balance, reserved, positions, orders, trophies
+
+
+def chunks(lines, size, limit=FIELD_LIMIT):
+    """Group lines into field values of at most size lines and limit characters once joined."""
+    groups, group, length = [], [], 0
+    for line in lines:
+        if len(line) > limit:
+            line = line[:limit - 1] + "…"
+        if group and (len(group) == size or length + 1 + len(line) > limit):
+            groups.append(group)
+            group, length = [], 0
+        length += len(line) + (1 if group else 0)
+        group.append(line)
+    if group:
+        groups.append(group)
+    return groups
+
+
+class Portfolios:
+    def __init__(self, db, rankings):
+        self.db = db
+        self.rankings = rankings
+        self._loop = asyncio.get_running_loop()
+        self._cache = {}
+        self._versions = {}
+        self._epoch = 0
+
+    def _version(self, user_id):
+        return self._epoch, self._versions.get(user_id, 0)
+
+    # Commands invalidate from the writer thread, but the cache is only ever
+    # touched on the event loop, so get() can't store a result between a
+    # version bump and its eviction.
+    def invalidate(self, user_ids):
+        self._loop.call_soon_threadsafe(self._invalidate, list(user_ids))
+
+    def clear(self):
+        """Invalidate everyone, e.g. after a settlement rewrote every holder's rows."""
+        self._loop.call_soon_threadsafe(self._clear)
+
+    def _invalidate(self, user_ids):
+        for user_id in user_ids:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._cache.pop(user_id, None)
+
+    def _clear(self):
+        self._epoch += 1
+        self._cache = {}
+
+    async def get(self, user_id):
+        cached = self._cache.get(user_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1]
+        version = self._version(user_id)
+        portfolio = await self.db.read(load_portfolio, user_id)
+        # An invalidation during the read means it may already be stale; serve it but don't cache it.
+        if version == self._version(user_id):
+            self._cache[user_id] = (time.monotonic() + PORTFOLIO_TTL, portfolio)
+        return portfolio
+
+    async def pages(self, member):
+        """/profile embeds for member, with positions marked to the latest prices."""
+        balance, reserved, positions, orders, trophies = await self.get(member.id)
+        prices = self.rankings.prices
+        position_lines, holdings_value = [], 0
+        for ticker, held, listed in positions:
+            mark = prices.get(ticker)
+            value = (held + listed) * mark if mark is not None else 0
+            holdings_value += value
+            listed_text = f" ({listed} listed)" if listed else ""
+            mark_text = f" × ✨ {mark:,.2f} = **✨ {value:,.2f}**" if mark is not None else ""
+            position_lines.append(f"`{ticker}`: **{held + listed}** tokens{listed_text}{mark_text}")
+        order_lines = []
+        for order in orders:
+            escrow = f" (✨ {order['amount'] * order['price_per_token']:,.2f} reserved)" if order['order_type'] == 'BUY' else ""
+            order_lines.append(f"ID:`{order['order_id']}` {order['order_type']} `{order['ticker']}`: **{order['amount']}** @ ✨{order['price_per_token']:.2f}{escrow}")
+
+        def page():
+            embed = discord.Embed(title=f"{member.display_name}'s Profile", color=discord.Color.blue()).set_thumbnail(url=member.display_avatar.url)
+            embed.add_field(name="Aura Balance", value=f"✨ {balance:,.2f}", inline=True)
+            embed.add_field(name="Reserved for Bids", value=f"✨ {reserved:,.2f}", inline=True)
+            embed.add_field(name="Net Worth", value=f"✨ {balance + reserved + holdings_value:,.2f}", inline=True)
+            return embed
+
+        pages = []
+        for lines in chunks(position_lines, POSITIONS_PER_PAGE):
+            pages.append(page().add_field(name="Positions", value="\n".join(lines), inline=False))
+        for lines in chunks(order_lines, ORDERS_PER_PAGE):
+            pages.append(page().add_field(name="Open Orders", value="\n".join(lines), inline=False))
+        if trophies:
+            trophy_lines = [f"{'🏆' if asset_type == 'TROPHY' else '🪦'} `{ticker}`: **{amount}** {ASSET_NAMES[asset_type]}" for ticker, amount, asset_type in trophies]
+            for lines in chunks(trophy_lines, POSITIONS_PER_PAGE):
+                pages.append(page().add_field(name="Trophy Cabinet", value="\n".join(lines), inline=False))
+        if not pages:
+            pages.append(page())
+
+        footer = "Positions are valued at the last trade or ICO price."
+        if orders:
+            footer += " Use /cancel_order <order_id> to cancel an order."
+        for number, embed in enumerate(pages, start=1):
+            embed.set_footer(text=f"Page {number}/{len(pages)} • {footer}" if len(pages) > 1 else footer)
+        return pages
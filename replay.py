@@ -0,0 +1,357 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from journal import snapshot_paths
+from orderbook import TRADING_FEE_PCT, Fill, Order, OrderBookManager
+from settlement import OUTCOMES
+from trades import record_fills
+
+# --- Offline Journal Replay ---
+# Rebuilds a guild's economy from a snapshot plus the events journaled after
+# it, entirely in Python dicts (no SQL per event), then checks the result
+# against the live database or writes it out as a fresh one. With --rematch the
+# recorded fills are ignored and the recorded order flow is run through the
+# order book again, to backtest changes to the matching rules on real traffic.
+#
+#   python replay.py economies/<guild_id>.db
+#   python replay.py economies/<guild_id>.db --output rebuilt.db
+#   python replay.py economies/<guild_id>.db --rematch auction:30
+#
+# Replayed commands are applied as they were issued; their validation (funds,
+# holdings, trading status) is not re-run, which matters only for --rematch.
+
+EVENT_QUERY = "SELECT seq, at, kind, user_id, ticker, order_id, amount, price, ref, data FROM events WHERE seq > ? ORDER BY seq"
+TOLERANCE = 1e-6
+
+
+class Ledger:
+    def __init__(self, rematch=None):
+        self.cash = {}
+        self.holdings = {}
+        self.orders = {}
+        self.goals = {}
+        self.claims = {}
+        self.minted = {}
+        self.auctions = {}
+        self.fills = []
+        self.seq = 0
+        self.rematch = rematch
+        self.books = OrderBookManager()
+        self._dirty = set()
+        self._next_auction = None
+        self._handlers = {
+            'ALLOWANCE': self._allowance, 'MINT': self._mint, 'ICO': self._ico, 'BUY': self._place, 'SELL': self._place,
+            'CANCEL': self._cancel, 'FILL': self._recorded_fill, 'EXPIRE': self._expire, 'RESOLVE': self._resolve, 'SETTLE': self._settle, 'AUCTION': self._auction,
+        }
+
+    def load(self, conn):
+        self.cash = {user_id: [balance or 0.0, reserved or 0.0] for user_id, balance, reserved in conn.execute("SELECT user_id, kcred_balance, reserved FROM users")}
+        self.holdings = {(user_id, ticker): [amount, asset_type] for user_id, ticker, amount, asset_type in conn.execute("SELECT user_id, ticker, amount, asset_type FROM holdings")}
+        self.orders = {row[0]: list(row[1:]) for row in conn.execute("SELECT order_id, user_id, ticker, order_type, amount, price_per_token, status FROM orders")}
+        self.goals = {ticker: [status, founder_id, ico_price] for ticker, status, founder_id, ico_price in conn.execute("SELECT ticker, status, founder_id, ico_price FROM goals")}
+        self.auctions = dict(conn.execute("SELECT ticker, auction_interval FROM goals WHERE auction_interval > 0"))
+        self.seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM events").fetchone()[0]
+        if self.rematch is not None:
+            self.books.load(conn)
+
+    def replay(self, conn):
+        applied = 0
+        for event in conn.execute(EVENT_QUERY, (self.seq,)):
+            if self._next_auction is not None and event[1] >= self._next_auction:
+                self._run_auctions(event[1])
+            self._handlers[event[2]](*event[1:])
+            self.seq = event[0]
+            applied += 1
+        if self.rematch is not None:
+            self._run_auctions(float('inf'))
+        return applied
+
+    def _account(self, user_id):
+        account = self.cash.get(user_id)
+        if account is None:
+            account = self.cash[user_id] = [0.0, 0.0]
+        return account
+
+    def _add_tokens(self, user_id, ticker, amount):
+        holding = self.holdings.get((user_id, ticker))
+        if holding is None:
+            self.holdings[(user_id, ticker)] = [amount, 'TOKEN']
+        else:
+            holding[0] += amount
+
+    # --- Event handlers: (at, kind, user_id, ticker, order_id, amount, price, ref, data) ---
+    def _allowance(self, at, kind, user_id, ticker, order_id, amount, price, ref, data):
+        self._account(user_id)[0] += amount
+        self.claims[user_id] = at
+
+    def _mint(self, at, kind, user_id, ticker, order_id, amount, price, ref, data):
+        details = json.loads(data)
+        self._account(user_id)[0] -= details['fee']
+        self.goals[ticker] = ['ICO', user_id, price]
+        self.holdings[(user_id, ticker)] = [amount, 'TOKEN']
+        self.minted[ticker] = details
+        if details.get('auction_interval'):
+            self.auctions[ticker] = details['auction_interval']
+
+    def _ico(self, at, kind, user_id, ticker, order_id, amount, price, ref, data):
+        cost = amount * price
+        self._account(user_id)[0] -= cost
+        self._account(ref)[0] += cost
+        self._add_tokens(user_id, ticker, amount)
+
+    def _place(self, at, kind, user_id, ticker, order_id, amount, price, ref, data):
+        if kind == 'BUY':
+            account = self._account(user_id)
+            account[0] -= amount * price
+            account[1] += amount * price
+        else:
+            self._add_tokens(user_id, ticker, -amount)
+            goal = self.goals.get(ticker)
+            if goal is not None and goal[0] == 'ICO':
+                goal[0] = 'ACTIVE'
+        self.orders[order_id] = [user_id, ticker, kind, amount, price, 'OPEN']
+        if self.rematch is not None:
+            self.books.add(Order(order_id, user_id, ticker, kind, amount, price))
+            self._trigger(ticker, at)
+
+    def _cancel(self, at, kind, user_id, ticker, order_id, amount, price, ref, data):
+        order = self.orders[order_id]
+        if order[5] != 'OPEN':
+            return  # Already filled in a rematch
+        self._release(order)
+        if self.rematch is not None:
+            self.books.remove(ticker, order_id)
+
+    def _release(self, order):
+        user_id, ticker, side, amount, price, _ = order
+        if side == 'SELL':
+            self._add_tokens(user_id, ticker, amount)
+        else:
+            account = self._account(user_id)
+            account[0] += amount * price
+            account[1] = max(account[1] - amount * price, 0)
+        order[5] = 'CANCELLED'
+
+    def _recorded_fill(self, at, kind, user_id, ticker, order_id, amount, price, ref, data):
+        if self.rematch is None:
+            self._fill(at, ticker, order_id, ref, amount, price)
+
+    def _fill(self, at, ticker, buy_order_id, sell_order_id, amount, price):
+        buy, sell = self.orders[buy_order_id], self.orders[sell_order_id]
+        value = amount * price
+        escrowed = amount * buy[4]
+        buyer = self._account(buy[0])
+        buyer[0] += escrowed - value
+        buyer[1] = max(buyer[1] - escrowed, 0)
+        self._account(sell[0])[0] += value - value * TRADING_FEE_PCT
+        self._add_tokens(buy[0], ticker, amount)
+        for order in (buy, sell):
+            order[3] -= amount
+            if order[3] <= 0:
+                order[5] = 'CLOSED'
+        self.fills.append((at, Fill(ticker, buy_order_id, sell_order_id, buy[0], sell[0], amount, price, buy[4])))
+
+    def _expire(self, at, kind, user_id, ticker, order_id, amount, price, ref, data):
+        self.goals[ticker][0] = 'EXPIRED'
+
+    def _resolve(self, at, kind, user_id, ticker, order_id, amount, price, ref, data):
+        self.goals[ticker][0] = 'SETTLING'
+
+    def _settle(self, at, kind, user_id, ticker, order_id, amount, price, ref, data):
+        asset_type, status = OUTCOMES[json.loads(data)]
+        for order in self.orders.values():
+            if order[1] == ticker and order[5] == 'OPEN':
+                self._release(order)
+        for key in [key for key, holding in self.holdings.items() if key[1] == ticker and holding[1] == 'TOKEN']:
+            if self.holdings[key][0] <= 0:
+                del self.holdings[key]
+            else:
+                self.holdings[key][1] = asset_type
+        self.goals[ticker][0] = status
+        self.books.drop(ticker)
+
+    def _auction(self, at, kind, user_id, ticker, order_id, amount, price, ref, data):
+        if amount:
+            self.auctions[ticker] = amount
+        else:
+            self.auctions.pop(ticker, None)
+
+    # --- Rematching ---
+    def _interval(self, ticker):
+        if self.rematch == 'recorded':
+            return self.auctions.get(ticker)
+        return self.rematch or None
+
+    def _trading(self, ticker):
+        return self.goals.get(ticker, [None])[0] == 'ACTIVE'
+
+    def _trigger(self, ticker, at):
+        if not self._trading(ticker):
+            return
+        interval = self._interval(ticker)
+        if interval is None:
+            for fill in self.books.get(ticker).match():
+                self._fill(at, ticker, fill.buy_order_id, fill.sell_order_id, fill.amount, fill.price)
+            return
+        self._dirty.add(ticker)
+        boundary = at - at % interval + interval
+        if self._next_auction is None or boundary < self._next_auction:
+            self._next_auction = boundary
+
+    def _run_auctions(self, now):
+        due, self._dirty, self._next_auction = self._dirty, set(), None
+        for ticker in due:
+            if not self._trading(ticker):
+                continue
+            interval = self._interval(ticker)
+            boundary = now if interval is None or now == float('inf') else now - now % interval
+            book = self.books.get(ticker)
+            last = next((fill.price for _, fill in reversed(self.fills) if fill.ticker == ticker), None)
+            for fill in book.uncross(reference=last):
+                self._fill(boundary, ticker, fill.buy_order_id, fill.sell_order_id, fill.amount, fill.price)
+
+    # --- Output ---
+    def verify(self, conn):
+        """Differences between the rebuilt state and a database, as readable strings."""
+        problems = []
+        cash = {user_id: (balance or 0.0, reserved or 0.0) for user_id, balance, reserved in conn.execute("SELECT user_id, kcred_balance, reserved FROM users")}
+        for user_id in set(cash) | set(self.cash):
+            expected, rebuilt = cash.get(user_id, (0.0, 0.0)), self.cash.get(user_id, [0.0, 0.0])
+            if abs(expected[0] - rebuilt[0]) > TOLERANCE or abs(expected[1] - rebuilt[1]) > TOLERANCE:
+                problems.append(f"user {user_id}: balance/reserved {rebuilt[0]:.4f}/{rebuilt[1]:.4f}, expected {expected[0]:.4f}/{expected[1]:.4f}")
+        holdings = {(user_id, ticker): (amount, asset_type) for user_id, ticker, amount, asset_type in conn.execute("SELECT user_id, ticker, amount, asset_type FROM holdings WHERE amount != 0")}
+        rebuilt_holdings = {key: tuple(holding) for key, holding in self.holdings.items() if holding[0] != 0}
+        for key in set(holdings) | set(rebuilt_holdings):
+            if holdings.get(key) != rebuilt_holdings.get(key):
+                problems.append(f"holding {key}: {rebuilt_holdings.get(key)}, expected {holdings.get(key)}")
+        for order_id, amount, status in conn.execute("SELECT order_id, amount, status FROM orders"):
+            order = self.orders.get(order_id)
+            if order is None or order[3] != amount or order[5] != status:
+                problems.append(f"order {order_id}: {order and (order[3], order[5])}, expected {(amount, status)}")
+        for ticker, status in conn.execute("SELECT ticker, status FROM goals"):
+            if self.goals.get(ticker, [None])[0] != status:
+                problems.append(f"goal {ticker}: {self.goals.get(ticker, [None])[0]}, expected {status}")
+        return problems
+
+    def write(self, conn, source):
+        """Write the rebuilt state into conn, a copy of the snapshot it was loaded from."""
+        conn.execute("ATTACH DATABASE ? AS source", (source,))
+        conn.executemany("INSERT INTO users (user_id, kcred_balance, reserved) VALUES (?, ?, ?) ON CONFLICT (user_id) DO UPDATE SET kcred_balance = excluded.kcred_balance, reserved = excluded.reserved",
+                         [(user_id, balance, reserved) for user_id, (balance, reserved) in self.cash.items()])
+        conn.executemany("UPDATE users SET last_weekly_claim = ? WHERE user_id = ?",
+                         [(datetime.utcfromtimestamp(at).isoformat(), user_id) for user_id, at in self.claims.items()])
+        conn.executemany("INSERT INTO goals (ticker, founder_id, scenario, target_score, tier, ico_price, status, initial_deadline, current_deadline) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (ticker) DO NOTHING",
+                         [(ticker, self.goals[ticker][1], d['scenario'], d['target_score'], d['tier'], self.goals[ticker][2], 'ICO', d['deadline'], d['deadline']) for ticker, d in self.minted.items()])
+        conn.executemany("UPDATE goals SET status = ?, auction_interval = ? WHERE ticker = ?",
+                         [(status, self.auctions.get(ticker), ticker) for ticker, (status, _, _) in self.goals.items()])
+        conn.execute("DELETE FROM holdings")
+        conn.executemany("INSERT INTO holdings (user_id, ticker, amount, asset_type) VALUES (?, ?, ?, ?)",
+                         [(user_id, ticker, amount, asset_type) for (user_id, ticker), (amount, asset_type) in self.holdings.items()])
+        conn.executemany("INSERT INTO orders (order_id, user_id, ticker, order_type, amount, price_per_token, status) VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (order_id) DO UPDATE SET amount = excluded.amount, status = excluded.status",
+                         [(order_id, *order) for order_id, order in self.orders.items()])
+        conn.execute("INSERT INTO events SELECT * FROM source.events WHERE seq > (SELECT COALESCE(MAX(seq), 0) FROM main.events) AND seq <= ?", (self.seq,))
+        conn.commit()
+        conn.execute("DETACH DATABASE source")
+        # Trades and candles are derived from fills, so regenerate them in pass-sized batches
+        batch, batch_at = [], None
+        for at, fill in self.fills:
+            if batch and at != batch_at:
+                record_fills(conn, batch, batch_at)
+                batch = []
+            batch.append(fill)
+            batch_at = at
+        record_fills(conn, batch, batch_at)
+        conn.commit()
+
+
+def summarize_fills(fills):
+    by_ticker = {}
+    for _, fill in fills:
+        volume, value, count = by_ticker.get(fill.ticker, (0, 0.0, 0))
+        by_ticker[fill.ticker] = (volume + fill.amount, value + fill.amount * fill.price, count + 1)
+    return by_ticker
+
+
+def recorded_fills(conn, since):
+    return [(at, Fill(ticker, order_id, ref, user_id, None, amount, price, None)) for at, ticker, order_id, ref, user_id, amount, price in
+            conn.execute("SELECT at, ticker, order_id, ref, user_id, amount, price FROM events WHERE kind = 'FILL' AND seq > ?", (since,))]
+
+
+def print_rematch(recorded, rematched):
+    print(f"\n{'ticker':<24}{'fills':>14}{'volume':>18}{'vwap':>22}")
+    before, after = summarize_fills(recorded), summarize_fills(rematched)
+    for ticker in sorted(set(before) | set(after)):
+        b, a = before.get(ticker, (0, 0.0, 0)), after.get(ticker, (0, 0.0, 0))
+        vwap_b = f"{b[1] / b[0]:.2f}" if b[0] else "-"
+        vwap_a = f"{a[1] / a[0]:.2f}" if a[0] else "-"
+        print(f"{ticker[:24]:<24}{f'{b[2]} -> {a[2]}':>14}{f'{b[0]} -> {a[0]}':>18}{f'{vwap_b} -> {vwap_a}':>22}")
+
+
+def parse_rematch(text):
+    if text in (None, 'recorded'):
+        return text
+    if text == 'continuous':
+        return 0
+    if text.startswith('auction:'):
+        return int(text.split(':', 1)[1])
+    raise argparse.ArgumentTypeError("expected recorded, continuous or auction:<seconds>")
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild an economy from a snapshot and its event journal.")
+    parser.add_argument("database", help="The guild's live database, e.g. economies/<guild_id>.db")
+    parser.add_argument("--snapshot", help="Snapshot to start from (default: the newest in --snapshot-dir)")
+    parser.add_argument("--snapshot-dir", default="snapshots")
+    parser.add_argument("--output", help="Write the rebuilt economy to this new database file")
+    parser.add_argument("--rematch", type=parse_rematch, help="Re-run matching instead of applying recorded fills: recorded, continuous or auction:<seconds>")
+    args = parser.parse_args(argv)
+
+    guild = os.path.splitext(os.path.basename(args.database))[0]
+    snapshot = args.snapshot or next(reversed(snapshot_paths(os.path.join(args.snapshot_dir, guild))), None)
+    ledger = Ledger(rematch=args.rematch)
+    if snapshot:
+        with sqlite3.connect(snapshot) as conn:
+            ledger.load(conn)
+        print(f"Loaded {snapshot} at event {ledger.seq}")
+    else:
+        print("No snapshot found; replaying the whole journal from an empty economy.")
+
+    live = sqlite3.connect(args.database)
+    live.execute("BEGIN")  # One read transaction: the journal and the state we compare against agree
+    started = time.perf_counter()
+    since = ledger.seq
+    applied = ledger.replay(live)
+    elapsed = time.perf_counter() - started
+    print(f"Replayed {applied:,} events in {elapsed:.2f}s ({applied / elapsed if elapsed else 0:,.0f} events/s), now at event {ledger.seq}")
+
+    status = 0
+    if args.rematch is not None:
+        print_rematch(recorded_fills(live, since), ledger.fills)
+    else:
+        problems = ledger.verify(live)
+        if problems:
+            print(f"\n{len(problems)} difference(s) from {args.database}:\n" + "\n".join(problems[:50]))
+            status = 1
+        else:
+            print(f"Rebuilt state matches {args.database}.")
+    live.rollback()
+    live.close()
+
+    if args.output:
+        if not snapshot:
+            print("--output needs a snapshot to build on.")
+            return 1
+        shutil.copyfile(snapshot, args.output)
+        with sqlite3.connect(args.output) as out:
+            ledger.write(out, args.database)
+        print(f"Wrote rebuilt economy to {args.output}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main_cli())
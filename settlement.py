@@ -0,0 +1,96 @@
+from datetime import datetime
+import journal
+
+# --- Goal Settlement ---
+# Resolving a goal happens in two steps. begin_settlement() is a quick
+# transaction that halts trading (status SETTLING) and records the outcome.
+# run_settlement() then does the bulk work with set-based statements in one
+# transaction, returning listed tokens and releasing buyers' escrowed Auras.
+# Every statement only touches rows still in their pre-settlement
+# state, so an interrupted run can simply be run again; pending_settlements()
+# lists what to resume at startup.
+
+OUTCOMES = {
+    "achieved": ("TROPHY", "ACHIEVED"),
+    "failed": ("RELIC", "FAILED"),
+}
+ASSET_NAMES = {"TROPHY": "Trophies", "RELIC": "Relics"}
+SETTLEABLE_STATUSES = ('ICO', 'ACTIVE', 'EXPIRED', 'SETTLING')
+
+REFUND_SELL_ORDERS = """
+    INSERT INTO holdings (user_id, ticker, amount)
+    SELECT user_id, ticker, SUM(amount) FROM orders
+    WHERE ticker = ? AND order_type = 'SELL' AND status = 'OPEN' AND amount > 0
+    GROUP BY user_id
+    ON CONFLICT (user_id, ticker) DO UPDATE SET amount = amount + excluded.amount
+"""
+
+RELEASE_BUY_ESCROW = """
+    UPDATE users SET kcred_balance = kcred_balance + escrow.total, reserved = MAX(reserved - escrow.total, 0)
+    FROM (
+        SELECT user_id, SUM(amount * price_per_token) AS total FROM orders
+        WHERE ticker = ? AND order_type = 'BUY' AND status = 'OPEN' AND amount > 0
+        GROUP BY user_id
+    ) AS escrow
+    WHERE users.user_id = escrow.user_id
+"""
+
+
+class SettlementError(Exception):
+    pass
+
+
+def begin_settlement(conn, ticker, outcome):
+    if outcome not in OUTCOMES:
+        raise SettlementError(f"Unknown outcome `{outcome}`.")
+    goal = conn.execute("SELECT status FROM goals WHERE ticker = ?", (ticker,)).fetchone()
+    if not goal:
+        raise SettlementError(f"No goal found with ticker `{ticker}`.")
+    if goal[0] not in SETTLEABLE_STATUSES:
+        raise SettlementError(f"`{ticker}` has already been settled. Its status is: `{goal[0]}`.")
+    existing = conn.execute("SELECT outcome FROM settlements WHERE ticker = ?", (ticker,)).fetchone()
+    if existing and existing[0] != outcome:
+        raise SettlementError(f"`{ticker}` is already being settled as `{existing[0]}`.")
+    conn.execute("UPDATE goals SET status = 'SETTLING' WHERE ticker = ?", (ticker,))
+    conn.execute(
+        "INSERT INTO settlements (ticker, outcome, status, started_at) VALUES (?, ?, 'PENDING', ?) ON CONFLICT (ticker) DO NOTHING",
+        (ticker, outcome, datetime.utcnow().isoformat())
+    )
+    journal.record(conn, 'RESOLVE', ticker=ticker, data=outcome)
+
+
+def run_settlement(conn, ticker):
+    """Settle one ticker in a single transaction and return its report."""
+    row = conn.execute("SELECT outcome, status FROM settlements WHERE ticker = ?", (ticker,)).fetchone()
+    if not row:
+        raise SettlementError(f"`{ticker}` has no settlement in progress.")
+    outcome, status = row
+    if status == 'DONE':
+        return settlement_report(conn, ticker)
+    asset_type, goal_status = OUTCOMES[outcome]
+
+    tokens_refunded = conn.execute(
+        "SELECT COALESCE(SUM(amount), 0) FROM orders WHERE ticker = ? AND order_type = 'SELL' AND status = 'OPEN'", (ticker,)
+    ).fetchone()[0]
+    conn.execute(REFUND_SELL_ORDERS, (ticker,))
+    conn.execute(RELEASE_BUY_ESCROW, (ticker,))
+    orders_cancelled = conn.execute("UPDATE orders SET status = 'CANCELLED' WHERE ticker = ? AND status = 'OPEN'", (ticker,)).rowcount
+    conn.execute("DELETE FROM holdings WHERE ticker = ? AND asset_type = 'TOKEN' AND amount <= 0", (ticker,))
+    holders = conn.execute("UPDATE holdings SET asset_type = ? WHERE ticker = ? AND asset_type = 'TOKEN'", (asset_type, ticker)).rowcount
+
+    conn.execute("UPDATE goals SET status = ? WHERE ticker = ?", (goal_status, ticker))
+    journal.record(conn, 'SETTLE', ticker=ticker, data=outcome)
+    conn.execute(
+        "UPDATE settlements SET status = 'DONE', holders = ?, orders_cancelled = ?, tokens_refunded = ?, finished_at = ? WHERE ticker = ?",
+        (holders, orders_cancelled, tokens_refunded, datetime.utcnow().isoformat(), ticker)
+    )
+    return settlement_report(conn, ticker)
+
+
+def settlement_report(conn, ticker):
+    row = conn.execute("SELECT ticker, outcome, status, holders, orders_cancelled, tokens_refunded FROM settlements WHERE ticker = ?", (ticker,)).fetchone()
+    return dict(zip(("ticker", "outcome", "status", "holders", "orders_cancelled", "tokens_refunded"), row))
+
+
+def pending_settlements(conn):
+    return [row[0] for row in conn.execute("SELECT ticker FROM settlements WHERE status = 'PENDING'")]
@@ -0,0 +1,48 @@
+import json
+import os
+import sqlite3
+import sys
+import types
+import pytest
+
+# The bot is a flat set of modules at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from leaderboard import Leaderboard  # noqa: E402
+from matching import MatchScheduler  # noqa: E402
+from migrations import migrate  # noqa: E402
+from orderbook import OrderBookManager  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def main(tmp_path_factory):
+    """The bot module, imported against a minimal config.json."""
+    pytest.importorskip("discord")
+    directory = tmp_path_factory.mktemp("bot")
+    (directory / "config.json").write_text(json.dumps({"weekly_allowances": [], "unranked_allowance": 150, "trading_channel_id": ""}))
+    cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
+
+
+class Portfolios:
+    def invalidate(self, user_ids):
+        pass
+
+    def clear(self):
+        pass
+
+
+@pytest.fixture
+def exchange(tmp_path):
+    path = str(tmp_path / "economy.db")
+    migrate(path)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    ex = types.SimpleNamespace(books=OrderBookManager(), rankings=Leaderboard(), portfolios=Portfolios(), matcher=MatchScheduler(None))
+    yield conn, ex
+    conn.close()
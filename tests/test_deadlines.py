@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+from deadlines import DeadlineScheduler
+
+
+def test_goals_due_in_the_same_second_expire_in_one_batch():
+    async def run():
+        batches = []
+        done = asyncio.Event()
+
+        async def expire(tickers):
+            batches.append(sorted(tickers))
+            done.set()
+
+        scheduler = DeadlineScheduler(expire)
+        due = time.time() + 0.2
+        for ticker in ('AAA', 'BBB', 'CCC'):
+            scheduler.schedule(ticker, due)
+        scheduler.schedule('LATER', due + 3600)
+        scheduler.start()
+        try:
+            await asyncio.wait_for(done.wait(), 5)
+            await asyncio.sleep(0.05)
+        finally:
+            scheduler.stop()
+        return batches, scheduler
+
+    batches, scheduler = asyncio.run(run())
+    assert batches == [['AAA', 'BBB', 'CCC']]
+    assert len(scheduler) == 1
+
+
+def test_rescheduled_goal_skips_its_outdated_deadline():
+    scheduler = DeadlineScheduler(None)
+    scheduler.schedule('AAA', 100)
+    scheduler.schedule('BBB', 100)
+    scheduler.schedule('AAA', 500)
+    assert scheduler._pop_due(200) == ['BBB']
+    assert scheduler.next() == 500
@@ -0,0 +1,48 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from orderbook import TRADING_FEE_PCT
+
+
+def totals(conn):
+    cash = conn.execute("SELECT SUM(kcred_balance + reserved), SUM(reserved) FROM users").fetchone()
+    escrow = conn.execute("SELECT COALESCE(SUM(amount * price_per_token), 0) FROM orders WHERE order_type = 'BUY' AND status = 'OPEN'").fetchone()[0]
+    fees = conn.execute("SELECT COALESCE(SUM(amount * price), 0) FROM trades").fetchone()[0] * TRADING_FEE_PCT
+    tokens = conn.execute("""
+        SELECT (SELECT SUM(amount) FROM holdings WHERE asset_type = 'TOKEN')
+             + (SELECT COALESCE(SUM(amount), 0) FROM orders WHERE order_type = 'SELL' AND status = 'OPEN')
+    """).fetchone()[0]
+    return cash[0] + fees, cash[1], escrow, tokens
+
+
+def test_escrow_conserves_auras_and_tokens(main, exchange):
+    conn, ex = exchange
+    rng = random.Random(11)
+    users = [1, 2, 3, 4]
+    for user_id in users:
+        main.claim_weekly(conn, ex, user_id, 1000)
+    main.create_goal(conn, ex, 1, 'TEST', 'scenario', '100', next(iter(main.TIERS)), 10.0, datetime.utcnow() + timedelta(days=7), 40)
+    main.place_sell_order(conn, ex, 1, 'TEST', 10, 12.0)
+    cash, _, _, tokens = totals(conn)
+
+    for _ in range(300):
+        user_id = rng.choice(users)
+        action = rng.random()
+        try:
+            if action < 0.45:
+                main.place_buy_order(conn, ex, user_id, 'TEST', rng.randint(1, 3), rng.choice([9.0, 10.5, 12.0, 13.25]))
+            elif action < 0.85:
+                main.place_sell_order(conn, ex, user_id, 'TEST', rng.randint(1, 3), rng.choice([9.5, 11.0, 12.0, 14.0]))
+            else:
+                order = conn.execute("SELECT order_id, user_id FROM orders WHERE status = 'OPEN' ORDER BY RANDOM() LIMIT 1").fetchone()
+                if order:
+                    main.cancel_open_order(conn, ex, order['user_id'], order['order_id'])
+        except main.CommandError:
+            continue
+        main.execute_matches(conn, ex, 'TEST')
+
+        now_cash, reserved, escrow, now_tokens = totals(conn)
+        assert now_cash == pytest.approx(cash)
+        assert reserved == pytest.approx(escrow)
+        assert now_tokens == tokens
+    assert conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0] > 0
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+import pytest
+
+
+@pytest.mark.parametrize("text", [
+    "buy 5@nan", "buy 5@inf", "sell 5@-inf", "buy 5@-1", "buy 0@10", "sell -2@10",
+    "buy 101@10", "buy 5@1000001", "hold 5@10", "buy 5 @ 10", "buy five@10", "", ", ;",
+    ", ".join(["buy 1@1"] * 26),
+])
+def test_parse_ladder_rejects_bad_levels(main, text):
+    with pytest.raises(main.CommandError):
+        main.parse_ladder(text)
+
+
+def test_parse_ladder_reads_sides_and_separators(main):
+    assert main.parse_ladder("buy 5@9.50; s 3@11, B 1@9") == [('BUY', 5, 9.5), ('SELL', 3, 11.0), ('BUY', 1, 9.0)]
+
+
+def test_place_orders_gives_each_level_its_own_order_id(main, exchange):
+    conn, ex = exchange
+    for user_id in (1, 2):
+        main.claim_weekly(conn, ex, user_id, 1000)
+    main.create_goal(conn, ex, 1, 'TEST', 'scenario', '100', next(iter(main.TIERS)), 10.0, datetime.utcnow() + timedelta(days=7), 40)
+    main.place_sell_order(conn, ex, 1, 'TEST', 5, 20.0)
+    main.place_buy_order(conn, ex, 2, 'TEST', 1, 1.0)
+    before = conn.execute("SELECT MAX(order_id) FROM orders").fetchone()[0]
+
+    levels = main.parse_ladder("sell 2@15, buy 3@9, sell 1@14, buy 1@8")
+    main.place_orders(conn, ex, 1, 'TEST', levels)
+
+    rows = conn.execute("SELECT order_id, order_type, amount, price_per_token FROM orders WHERE order_id > ? ORDER BY order_id", (before,)).fetchall()
+    assert [tuple(row)[1:] for row in rows] == list(levels)
+    book = ex.books.get('TEST')
+    for order_id, side, amount, price in rows:
+        order = book.orders[order_id]
+        assert (order.side, order.amount, order.price, order.user_id) == (side, amount, price, 1)
+    logged = conn.execute("SELECT order_id FROM events WHERE kind IN ('BUY', 'SELL') AND order_id > ? ORDER BY seq", (before,)).fetchall()
+    assert [row[0] for row in logged] == [row['order_id'] for row in rows]
@@ -0,0 +1,20 @@
+import random
+from leaderboard import RankTree
+
+
+def test_rank_tree_matches_sorted_list():
+    rng = random.Random(3)
+    tree, keys = RankTree(), set()
+    for _ in range(2000):
+        key = (-rng.randint(0, 50), rng.randint(0, 30))
+        if key in keys and rng.random() < 0.5:
+            tree.remove(key)
+            keys.discard(key)
+        elif key not in keys:
+            tree.insert(key)
+            keys.add(key)
+    ordered = sorted(keys)
+    assert len(tree) == len(ordered)
+    assert [tree.nth(i) for i in range(len(ordered))] == ordered
+    for i, key in enumerate(ordered):
+        assert tree.rank(key) == i
@@ -0,0 +1,97 @@
+import random
+from orderbook import Order, OrderBook
+
+
+def book_with(*orders):
+    book = OrderBook('TEST')
+    for order_id, side, amount, price in orders:
+        book.add(Order(order_id, order_id, 'TEST', side, amount, price))
+    return book
+
+
+def test_match_fills_at_resting_price_in_time_priority():
+    book = book_with((1, 'SELL', 2, 10.0), (2, 'SELL', 2, 10.0), (3, 'SELL', 2, 9.0), (4, 'BUY', 5, 11.0))
+    fills = book.match()
+    assert [(f.sell_order_id, f.amount, f.price) for f in fills] == [(3, 2, 9.0), (1, 2, 10.0), (2, 1, 10.0)]
+    assert all(f.buy_limit == 11.0 for f in fills)
+    assert book.best('SELL').order_id == 2 and book.best('SELL').amount == 1
+    assert book.best('BUY') is None
+
+
+def test_incoming_sell_fills_at_resting_bid():
+    book = book_with((1, 'BUY', 3, 12.0), (2, 'SELL', 3, 10.0))
+    assert [(f.amount, f.price) for f in book.match()] == [(3, 12.0)]
+
+
+def test_partial_fill_keeps_time_priority_at_a_level():
+    book = book_with((1, 'BUY', 5, 10.0), (2, 'BUY', 5, 10.0), (3, 'SELL', 3, 10.0))
+    assert [(f.buy_order_id, f.amount) for f in book.match()] == [(1, 3)]
+    assert book.best('BUY').order_id == 1 and book.best('BUY').amount == 2
+    book.add(Order(4, 4, 'TEST', 'SELL', 4, 9.0))
+    assert [(f.buy_order_id, f.amount, f.price) for f in book.match()] == [(1, 2, 10.0), (2, 2, 10.0)]
+
+
+def test_iterations_count_loop_steps_and_stale_heap_pops():
+    book = book_with((1, 'SELL', 1, 9.0), (2, 'SELL', 1, 10.0), (3, 'BUY', 2, 11.0))
+    book.remove(1)
+    book.match()
+    # One step that fills, one that finds no asks left, and both emptied ask levels popped on the way.
+    assert book.iterations == 4
+
+
+def test_remove_and_depth_stay_consistent():
+    book = book_with((1, 'BUY', 3, 9.0), (2, 'BUY', 4, 9.0), (3, 'BUY', 1, 8.0))
+    book.remove(1)
+    assert book.depth('BUY', 5) == ([(9.0, 4), (8.0, 1)], 2)
+    assert book.top('BUY') == 9.0
+    book.remove(2)
+    assert book.top('BUY') == 8.0 and book.best('BUY').order_id == 3
+
+
+def test_top_skips_emptied_levels_without_popping_them():
+    book = book_with((1, 'SELL', 2, 9.0), (2, 'SELL', 2, 10.0))
+    book.remove(1)
+    # The stale 9.0 heap entry stays until the writer's next best() pops it
+    assert book.top('SELL') == 10.0 and book.iterations == 0
+    assert book.best('SELL').order_id == 2 and book.iterations == 1
+    assert book.top('BUY') is None
+
+
+def brute_force_clearing(bids, asks):
+    best = 0
+    for price in {price for _, price in bids} | {price for _, price in asks}:
+        demand = sum(amount for amount, limit in bids if limit >= price)
+        supply = sum(amount for amount, limit in asks if limit <= price)
+        best = max(best, min(demand, supply))
+    return best
+
+
+def test_clearing_price_maximises_volume():
+    rng = random.Random(7)
+    for _ in range(300):
+        bids = [(rng.randint(1, 5), rng.choice([8.0, 9.0, 10.0, 11.0, 12.0])) for _ in range(rng.randint(0, 6))]
+        asks = [(rng.randint(1, 5), rng.choice([8.0, 9.0, 10.0, 11.0, 12.0])) for _ in range(rng.randint(0, 6))]
+        book = book_with(*[(i, 'BUY', amount, price) for i, (amount, price) in enumerate(bids)],
+                         *[(100 + i, 'SELL', amount, price) for i, (amount, price) in enumerate(asks)])
+        price, volume = book.clearing_price()
+        assert volume == brute_force_clearing(bids, asks)
+        if volume:
+            assert sum(a for a, limit in bids if limit >= price) >= volume
+            assert sum(a for a, limit in asks if limit <= price) >= volume
+
+
+def test_uncross_fills_clearing_volume_at_one_price():
+    book = book_with((1, 'SELL', 3, 9.0), (2, 'SELL', 3, 11.0), (3, 'BUY', 2, 12.0), (4, 'BUY', 3, 10.0))
+    price, volume = book.clearing_price()
+    fills = book.uncross()
+    assert {f.price for f in fills} == {price}
+    assert sum(f.amount for f in fills) == volume == 3
+    buy, sell = book.best('BUY'), book.best('SELL')
+    assert buy is None or sell is None or buy.price < sell.price
+
+
+def test_clearing_price_ties_go_to_the_reference_price():
+    book = book_with((1, 'BUY', 2, 12.0), (2, 'SELL', 2, 9.0))
+    assert book.clearing_price(reference=9.5) == (9.0, 2)
+    assert book.clearing_price(reference=11.5) == (12.0, 2)
+    assert book.depth('BUY', 5) == ([(12.0, 2)], 1) and book.depth('SELL', 5) == ([(9.0, 2)], 1)
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+import pytest
+
+pytest.importorskip("discord")
+
+from portfolio import FIELD_LIMIT, Portfolios, chunks  # noqa: E402
+
+
+def test_chunks_split_by_count_and_by_field_length():
+    assert chunks(["a"] * 5, 2) == [["a", "a"], ["a", "a"], ["a"]]
+    lines = ["x" * 400] * 5
+    groups = chunks(lines, 10)
+    assert [len(group) for group in groups] == [2, 2, 1]
+    assert all(len("\n".join(group)) <= FIELD_LIMIT for group in groups)
+    (long,), = chunks(["y" * 5000], 10)
+    assert len(long) == FIELD_LIMIT and long.endswith("…")
+
+
+class CountingDB:
+    def __init__(self):
+        self.reads = 0
+        self.during_read = None
+
+    async def read(self, fn, user_id):
+        self.reads += 1
+        await asyncio.sleep(0)
+        if self.during_read:
+            self.during_read()
+            await asyncio.sleep(0)
+        return (self.reads, user_id)
+
+
+def test_portfolio_cache_invalidates_per_user_and_clears_for_everyone():
+    async def run():
+        db = CountingDB()
+        portfolios = Portfolios(db, rankings=None)
+        assert await portfolios.get(1) == (1, 1)
+        assert await portfolios.get(1) == (1, 1)
+        assert await portfolios.get(2) == (2, 2)
+
+        # Commands invalidate from the writer thread; the loop applies it
+        writer = threading.Thread(target=portfolios.invalidate, args=([1],))
+        writer.start()
+        writer.join()
+        await asyncio.sleep(0)
+        assert await portfolios.get(1) == (3, 1)
+        assert await portfolios.get(2) == (2, 2)
+
+        portfolios.clear()
+        await asyncio.sleep(0)
+        assert await portfolios.get(2) == (4, 2)
+        assert await portfolios.get(1) == (5, 1)
+
+        # A read that an invalidation overtakes is served but not cached
+        db.during_read = lambda: portfolios.invalidate([1])
+        portfolios.invalidate([1])
+        await asyncio.sleep(0)
+        assert await portfolios.get(1) == (6, 1)
+        db.during_read = None
+        assert await portfolios.get(1) == (7, 1)
+        assert await portfolios.get(1) == (7, 1)
+
+    asyncio.run(run())
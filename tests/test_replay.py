@@ -0,0 +1,57 @@
+import random
+import sqlite3
+from datetime import datetime, timedelta
+import journal
+from settlement import begin_settlement
+
+
+def trade(main, conn, ex, rng, steps):
+    users = [1, 2, 3, 4]
+    for _ in range(steps):
+        user_id = rng.choice(users)
+        action = rng.random()
+        try:
+            if action < 0.45:
+                main.place_buy_order(conn, ex, user_id, 'TEST', rng.randint(1, 3), rng.choice([9.0, 10.5, 12.0]))
+            elif action < 0.85:
+                main.place_sell_order(conn, ex, user_id, 'TEST', rng.randint(1, 3), rng.choice([9.5, 11.0, 12.0]))
+            else:
+                order = conn.execute("SELECT order_id, user_id FROM orders WHERE status = 'OPEN' ORDER BY RANDOM() LIMIT 1").fetchone()
+                if order:
+                    main.cancel_open_order(conn, ex, order['user_id'], order['order_id'])
+        except main.CommandError:
+            continue
+        main.execute_matches(conn, ex, 'TEST')
+
+
+def test_replay_rebuilds_what_the_bot_wrote(main, exchange, tmp_path):
+    from replay import Ledger  # Needs discord through trades.py
+
+    conn, ex = exchange
+    rng = random.Random(5)
+    deadline = datetime.utcnow() + timedelta(days=7)
+    for user_id in (1, 2, 3, 4):
+        main.claim_weekly(conn, ex, user_id, 1000)
+    main.create_goal(conn, ex, 1, 'TEST', 'scenario', '100', next(iter(main.TIERS)), 10.0, deadline, 40)
+    main.create_goal(conn, ex, 2, 'GONE', 'scenario', '200', next(iter(main.TIERS)), 5.0, deadline, 40)
+    main.purchase_ico(conn, ex, 3, 'TEST', 20)
+    main.purchase_ico(conn, ex, 4, 'GONE', 10)
+    main.place_sell_order(conn, ex, 1, 'TEST', 10, 12.0)
+    trade(main, conn, ex, rng, 100)
+    snapshot = journal.take_snapshot(conn, str(tmp_path / "snapshots"))
+    trade(main, conn, ex, rng, 100)
+    main.mark_expired(conn, ['GONE'], (deadline + timedelta(days=1)).isoformat())
+    begin_settlement(conn, 'TEST', 'achieved')
+    main.settle_ticker(conn, ex, 'TEST')
+    assert conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0] > 0
+
+    from_scratch = Ledger()
+    from_scratch.replay(conn)
+    assert from_scratch.verify(conn) == []
+
+    from_snapshot = Ledger()
+    with sqlite3.connect(snapshot) as copy:
+        from_snapshot.load(copy)
+    assert 0 < from_snapshot.seq < from_scratch.seq
+    assert from_snapshot.replay(conn) > 0
+    assert from_snapshot.verify(conn) == []
@@ -0,0 +1,39 @@
+import sqlite3
+
+from migrations import migrate
+from settlement import begin_settlement, run_settlement
+
+
+def state(conn):
+    return (
+        conn.execute("SELECT user_id, kcred_balance, reserved FROM users ORDER BY user_id").fetchall(),
+        conn.execute("SELECT user_id, ticker, amount, asset_type FROM holdings ORDER BY user_id, ticker").fetchall(),
+        conn.execute("SELECT order_id, status FROM orders ORDER BY order_id").fetchall(),
+        conn.execute("SELECT status FROM goals").fetchall(),
+    )
+
+
+def test_rerunning_a_settlement_changes_nothing(tmp_path):
+    path = str(tmp_path / "economy.db")
+    migrate(path)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO users (user_id, kcred_balance, reserved) VALUES (?, ?, ?)", [(1, 100, 0), (2, 50, 30), (3, 10, 0)])
+    conn.execute("INSERT INTO goals (ticker, founder_id, status) VALUES ('TEST', 1, 'ACTIVE')")
+    conn.executemany("INSERT INTO holdings (user_id, ticker, amount) VALUES (?, 'TEST', ?)", [(1, 5), (3, 2)])
+    conn.executemany("INSERT INTO orders (user_id, ticker, order_type, amount, price_per_token) VALUES (?, 'TEST', ?, ?, ?)",
+                     [(1, 'SELL', 3, 12.0), (2, 'BUY', 3, 10.0), (3, 'SELL', 2, 15.0)])
+    begin_settlement(conn, 'TEST', 'achieved')
+    conn.commit()
+
+    report = run_settlement(conn, 'TEST')
+    conn.commit()
+    settled = state(conn)
+    assert report == {"ticker": 'TEST', "outcome": 'achieved', "status": 'DONE', "holders": 2, "orders_cancelled": 3, "tokens_refunded": 5}
+    assert settled[0] == [(1, 100, 0), (2, 80, 0), (3, 10, 0)]
+    assert settled[1] == [(1, 'TEST', 8, 'TROPHY'), (3, 'TEST', 4, 'TROPHY')]
+
+    # A resumed /resolve (or a restart mid-settlement) runs it again.
+    rerun = run_settlement(conn, 'TEST')
+    conn.commit()
+    assert rerun == report
+    assert state(conn) == settled
@@ -0,0 +1,71 @@
+import bisect
+import time
+
+# --- Ticker Autocomplete Index ---
+# Autocomplete fires on every keystroke and must answer inside Discord's
+# 3-second window, so it is served entirely from memory. A sorted array of
+# lowercased search keys (the ticker and its segments, the scenario and its
+# words) gives prefix lookups by bisect. Matches are ranked by traded volume
+# that halves every day, which fills feed in as they are announced.
+
+VOLUME_HALF_LIFE = 86400
+MAX_SUGGESTIONS = 25
+
+
+class TickerIndex:
+    def __init__(self):
+        self.goals = {}
+        self._keys = []
+        self._volume = {}
+
+    def __len__(self):
+        return len(self.goals)
+
+    def load(self, conn, since=None):
+        since = time.time() - VOLUME_HALF_LIFE if since is None else since
+        for ticker, scenario, status in conn.execute("SELECT ticker, scenario, status FROM goals"):
+            self.add(ticker, scenario, status)
+        for ticker, volume in conn.execute("SELECT ticker, SUM(volume) FROM candles WHERE interval = '1h' AND bucket_start >= ? GROUP BY ticker", (int(since),)):
+            self._volume[ticker] = (volume, time.time())
+
+    def add(self, ticker, scenario, status):
+        if ticker not in self.goals:
+            keys = {ticker.lower(), *ticker.lower().split('-'), scenario.lower(), *scenario.lower().split()}
+            for key in keys:
+                bisect.insort(self._keys, (key, ticker))
+        self.goals[ticker] = (scenario, status)
+
+    def set_status(self, ticker, status, only_from=None):
+        """Returns whether the status changed."""
+        goal = self.goals.get(ticker)
+        if goal is not None and goal[1] != status and (only_from is None or goal[1] in only_from):
+            self.goals[ticker] = (goal[0], status)
+            return True
+        return False
+
+    def record_volume(self, ticker, amount, now=None):
+        now = time.time() if now is None else now
+        self._volume[ticker] = (self.volume(ticker, now) + amount, now)
+
+    def volume(self, ticker, now=None):
+        volume, updated = self._volume.get(ticker, (0, 0))
+        if not volume:
+            return 0
+        now = time.time() if now is None else now
+        return volume * 0.5 ** ((now - updated) / VOLUME_HALF_LIFE)
+
+    def search(self, prefix, statuses=None, limit=MAX_SUGGESTIONS):
+        """Tickers whose ticker, scenario or a scenario word starts with prefix, busiest first."""
+        prefix = prefix.strip().lower()
+        if prefix:
+            matches = set()
+            for key, ticker in self._keys[bisect.bisect_left(self._keys, (prefix,)):]:
+                if not key.startswith(prefix):
+                    break
+                matches.add(ticker)
+        else:
+            matches = self.goals.keys()
+        if statuses is not None:
+            matches = [ticker for ticker in matches if self.goals[ticker][1] in statuses]
+        now = time.time()
+        return sorted(matches, key=lambda ticker: (-self.volume(ticker, now), ticker))[:limit]
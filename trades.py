@@ -0,0 +1,98 @@
+import time
+from datetime import datetime
+import discord
+
+# --- Trade Ledger & OHLCV Candles ---
+# Every fill is appended to `trades` in the matching transaction, and the
+# 1h/1d/1w candles it falls into are upserted alongside it. Charts read only
+# the candle table, so their cost depends on the range shown, not on how many
+# trades a ticker has.
+
+INTERVALS = {
+    "1h": 3600,
+    "1d": 86400,
+    "1w": 604800,
+}
+# The epoch starts on a Thursday; shift weekly buckets so they open on Monday.
+BUCKET_OFFSETS = {"1w": 4 * 86400}
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+CHART_CANDLES = 48
+TABLE_ROWS = 12
+
+CANDLE_UPSERT = """
+    INSERT INTO candles (ticker, interval, bucket_start, open, high, low, close, volume, trade_count)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (ticker, interval, bucket_start) DO UPDATE SET
+        high = MAX(high, excluded.high),
+        low = MIN(low, excluded.low),
+        close = excluded.close,
+        volume = volume + excluded.volume,
+        trade_count = trade_count + excluded.trade_count
+"""
+
+
+def bucket_start(timestamp, interval):
+    size, offset = INTERVALS[interval], BUCKET_OFFSETS.get(interval, 0)
+    return int((timestamp - offset) // size * size + offset)
+
+
+def record_fills(conn, fills, timestamp=None):
+    """Append fills to the ledger and roll them into every candle interval."""
+    if not fills:
+        return
+    timestamp = time.time() if timestamp is None else timestamp
+    executed_at = datetime.utcfromtimestamp(timestamp).isoformat()
+    conn.executemany(
+        "INSERT INTO trades (ticker, buy_order_id, sell_order_id, buyer_id, seller_id, amount, price, executed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(f.ticker, f.buy_order_id, f.sell_order_id, f.buyer_id, f.seller_id, f.amount, f.price, executed_at) for f in fills]
+    )
+
+    by_ticker = {}
+    for fill in fills:
+        by_ticker.setdefault(fill.ticker, []).append(fill)
+    rows = []
+    for ticker, ticker_fills in by_ticker.items():
+        prices = [f.price for f in ticker_fills]
+        volume = sum(f.amount for f in ticker_fills)
+        for interval in INTERVALS:
+            rows.append((ticker, interval, bucket_start(timestamp, interval), prices[0], max(prices), min(prices), prices[-1], volume, len(ticker_fills)))
+    conn.executemany(CANDLE_UPSERT, rows)
+
+
+def load_candles(conn, ticker, interval, limit=CHART_CANDLES):
+    rows = conn.execute(
+        "SELECT bucket_start, open, high, low, close, volume, trade_count FROM candles WHERE ticker = ? AND interval = ? ORDER BY bucket_start DESC LIMIT ?",
+        (ticker, interval, limit)
+    ).fetchall()
+    return rows[::-1]
+
+
+def sparkline(values):
+    low, high = min(values), max(values)
+    if high == low:
+        return SPARK_CHARS[len(SPARK_CHARS) // 2] * len(values)
+    scale = (len(SPARK_CHARS) - 1) / (high - low)
+    return "".join(SPARK_CHARS[int((v - low) * scale)] for v in values)
+
+
+def render_chart(ticker, interval, candles):
+    closes = [c['close'] for c in candles]
+    first_open, last_close = candles[0]['open'], closes[-1]
+    change = (last_close - first_open) / first_open * 100 if first_open else 0
+
+    embed = discord.Embed(title=f"📊 `{ticker}` · {interval} candles", color=discord.Color.teal())
+    embed.add_field(name="Last Price", value=f"✨ {last_close:,.2f}", inline=True)
+    embed.add_field(name="Change", value=f"{change:+.2f}%", inline=True)
+    embed.add_field(name="Volume", value=f"{sum(c['volume'] for c in candles):,} tokens", inline=True)
+    embed.add_field(name="Range", value=f"✨ {min(c['low'] for c in candles):,.2f} - {max(c['high'] for c in candles):,.2f}", inline=True)
+    embed.add_field(name="Trades", value=f"{sum(c['trade_count'] for c in candles):,}", inline=True)
+    embed.add_field(name="Close", value=f"`{sparkline(closes)}`", inline=False)
+
+    header = f"{'Time (UTC)':<12}{'Open':>8}{'High':>8}{'Low':>8}{'Close':>8}{'Vol':>6}"
+    lines = [header]
+    for c in candles[-TABLE_ROWS:]:
+        label = datetime.utcfromtimestamp(c['bucket_start']).strftime("%m-%d %H:%M" if interval == "1h" else "%Y-%m-%d")
+        lines.append(f"{label:<12}{c['open']:>8.2f}{c['high']:>8.2f}{c['low']:>8.2f}{c['close']:>8.2f}{c['volume']:>6}")
+    embed.add_field(name="Recent Candles", value="```\n" + "\n".join(lines) + "\n```", inline=False)
+    embed.set_footer(text=f"Showing {len(candles)} candle(s). Times are bucket starts.")
+    return embed